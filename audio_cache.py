@@ -0,0 +1,482 @@
+# ──────────────────────────────────────────────────────────────
+#  audio_cache.py — downloads/ için kalıcı, boyut sınırlı ses önbelleği
+#  Birden çok oda süreci aynı klasörü paylaşabilir: index değişiklikleri
+#  dosya kilidi altında diskteki index'le birleştirilir, her süreç
+#  kullandığı dosyaları inuse-<oda>.json ile bildirir (sahibi çalışmayan
+#  veya uzun süredir yenilenmeyen bildirimler yok sayılır).
+#  Kilit bekleyen ve index yazan işlemler event loop dışında (thread'de)
+#  çalışır; önbellek isabetlerinin kullanım bilgisi toplu yazılır.
+# ──────────────────────────────────────────────────────────────
+
+import asyncio
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, FrozenSet, Iterable, Optional, Set
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+try:
+    import psutil  # İsteğe bağlı — Windows'ta süreç canlılığı için
+except ImportError:
+    psutil = None
+
+AUDIO_EXTENSIONS = ("mp3", "m4a", "opus", "webm", "ogg", "mp4")
+INDEX_FILENAME = "index.json"
+LOCKS_DIRNAME = ".locks"
+INUSE_PREFIX = "inuse-"
+SIDECAR_SUFFIXES = (".loudness.json",)  # Parçayla birlikte silinecek yan dosyalar
+# Bu kadar süredir değişmeyen yarım indirmeler terk edilmiş sayılır (başka oda indiriyor olabilir)
+STALE_PARTIAL_AGE = 10 * 60
+# Önbellek isabetlerinin (son kullanım, sayaç) index'e toplu yazılma gecikmesi (saniye)
+USAGE_FLUSH_DELAY = 5.0
+# Sahibinin canlılığı anlaşılamayan kullanım bildirimi bu kadar eskiyse yok sayılır
+INUSE_TTL = 12 * 3600
+
+# Önbellek bütçesi (MB) — MEETBOT_CACHE_MAX_MB ortam değişkeniyle değiştirilebilir
+CACHE_MAX_BYTES = int(os.environ.get("MEETBOT_CACHE_MAX_MB", "2048")) * 1024 * 1024
+
+
+class FileLock:
+    """
+    Süreçler arası basit dosya kilidi (Windows: msvcrt, diğerleri: fcntl).
+    Aynı süreç içinde iç içe kullanılmamalıdır. Bloklayan acquire() event
+    loop'ta çağrılmamalıdır; async kod acquire_async() kullanır.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        f = open(self.path, "a+")
+        while True:
+            try:
+                if os.name == "nt":
+                    # LK_LOCK en fazla ~10 sn dener, sonra OSError → tekrar dene
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+                else:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    # Beklerken dosya silindiyse (remove) kilit artık kimseyi
+                    # dışlamaz: yeni dosyayla baştan dene
+                    if not self._same_file(f):
+                        f.close()
+                        f = open(self.path, "a+")
+                        continue
+                self._file = f
+                return True
+            except OSError:
+                if not blocking:
+                    f.close()
+                    return False
+
+    def _same_file(self, f) -> bool:
+        try:
+            return os.fstat(f.fileno()).st_ino == os.stat(self.path).st_ino
+        except OSError:
+            return False
+
+    async def acquire_async(self):
+        """
+        Kilidi event loop'u bloklamadan (thread'de) al. Bekleyen görev iptal
+        edilirse, thread sonradan kilidi alsa bile hemen bırakılır.
+        """
+        future = asyncio.get_running_loop().run_in_executor(None, self.acquire)
+        try:
+            await asyncio.shield(future)
+        except asyncio.CancelledError:
+            future.add_done_callback(
+                lambda f: self.release() if not f.cancelled() and f.exception() is None else None
+            )
+            raise
+
+    def remove(self):
+        """Kilit dosyasını sil (kilit tutulurken çağrılır; bekleyenler yeni dosyaya geçer)."""
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass   # Windows: başka süreç açık tutuyorsa silinemez, sorun değil
+
+    def release(self):
+        f, self._file = self._file, None
+        if f is None:
+            return
+        try:
+            if os.name == "nt":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        finally:
+            f.close()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class AudioCache:
+    """
+    İçerik anahtarlı (key -> dosya) ses önbelleği.
+    Dosyalar `<key>.<ext>` olarak saklanır, index.json son kullanım zamanını
+    ve kullanım sayısını tutar. Bütçe aşılınca en eski kullanılan (LRU)
+    ve o an kullanılmayan dosyalar silinir.
+    """
+
+    def __init__(self, root: str, max_bytes: int = CACHE_MAX_BYTES, owner: str = "default"):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.owner = owner
+        self.index_path = os.path.join(root, INDEX_FILENAME)
+        self.entries: Dict[str, dict] = {}  # key -> {file, size, last_used, hits}
+        self.total_bytes = 0
+        self._in_use_provider: Optional[Callable[[], Iterable[str]]] = None
+        self._lock = FileLock(os.path.join(root, LOCKS_DIRNAME, "index.lock"))
+        self._thread_lock = threading.Lock()   # Aynı süreçteki thread'ler sırayla
+        self._published_in_use: Optional[list] = None
+        self._usage_dirty = False
+        self._flush_task: Optional[asyncio.Task] = None
+
+    @contextmanager
+    def _locked(self):
+        """Index kilidi (süreç içi + süreçler arası). Sadece thread'de kullanılır."""
+        with self._thread_lock, self._lock:
+            yield
+
+    def set_in_use_provider(self, cb: Callable[[], Iterable[str]]):
+        """
+        Kuyrukta/çalan dosya yollarını döndüren callback'i kaydet.
+        Event loop'ta çağrılır; sonuç thread'deki temizliğe kopya olarak verilir.
+        """
+        self._in_use_provider = cb
+
+    def _local_in_use(self) -> FrozenSet[str]:
+        if self._in_use_provider is None:
+            return frozenset()
+        return frozenset(os.path.basename(p) for p in self._in_use_provider() if p)
+
+    def key_lock(self, key: str) -> FileLock:
+        """Aynı parçayı iki sürecin aynı anda indirmemesi için anahtar kilidi."""
+        return FileLock(os.path.join(self.root, LOCKS_DIRNAME, f"{key}.lock"))
+
+    # ── Odalar arası kullanım bildirimi ──────────────────────
+
+    def publish_in_use(self, paths: Iterable[str]):
+        """Bu sürecin kullandığı dosyaları diğer süreçlere bildir (değiştiyse yazar)."""
+        names = sorted({os.path.basename(p) for p in paths if p})
+        if names == self._published_in_use:
+            return
+        self._published_in_use = names
+        path = os.path.join(self.root, f"{INUSE_PREFIX}{self.owner}.json")
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"pid": os.getpid(), "files": names}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"⚠️  Kullanım listesi yazılamadı: {e}")
+
+    def _in_use_by_others(self) -> Set[str]:
+        """
+        Diğer odaların bildirdiği dosyalar. Sahibi çalışmayan (ör. MEETBOT_ROOMS'tan
+        çıkarılmış oda) bildirimler silinir; canlılık anlaşılamıyorsa INUSE_TTL'den
+        eski olanlar yok sayılır.
+        """
+        names: Set[str] = set()
+        own = f"{INUSE_PREFIX}{self.owner}.json"
+        now = time.time()
+        for path in glob.glob(os.path.join(self.root, f"{INUSE_PREFIX}*.json")):
+            if os.path.basename(path) == own:
+                continue
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                mtime = os.path.getmtime(path)
+            except (OSError, ValueError):
+                continue
+
+            pid = data.get("pid") if isinstance(data, dict) else None
+            alive = _pid_alive(pid) if pid else None
+            if alive is False:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            if alive is None and now - mtime > INUSE_TTL:
+                continue
+            names.update(data.get("files", []) if isinstance(data, dict) else data)
+        return names
+
+    # ── Index ────────────────────────────────────────────────
+
+    def load(self):
+        """
+        Açılışta index.json'u oku ve klasörle eşleştir.
+        Index'te olmayan dosyalar eklenir, diski kaybolan kayıtlar ve
+        yarım kalmış indirmeler (.part, .ytdl) temizlenir.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        with self._locked():
+            self._load_locked()
+
+    def _load_locked(self):
+        stored = self._read_index()
+
+        entries = {}
+        sidecars = []
+        now = time.time()
+        for filename in os.listdir(self.root):
+            path = os.path.join(self.root, filename)
+            if not os.path.isfile(path) or filename == INDEX_FILENAME:
+                continue
+
+            if filename.endswith((".part", ".ytdl", ".tmp")) or ".temp." in filename:
+                try:
+                    # Başka bir odanın süren indirmesine dokunma
+                    if now - os.path.getmtime(path) > STALE_PARTIAL_AGE:
+                        os.remove(path)
+                except OSError:
+                    pass
+                continue
+
+            if filename.endswith(SIDECAR_SUFFIXES):
+                sidecars.append(filename)
+                continue
+
+            key, _, ext = filename.rpartition(".")
+            if not key or ext not in AUDIO_EXTENSIONS:
+                continue
+
+            st = os.stat(path)
+            old = stored.get(key, {})
+            entries[key] = {
+                "file": filename,
+                "size": st.st_size,
+                "last_used": old.get("last_used", st.st_mtime),
+                "hits": old.get("hits", 0),
+            }
+
+        # Parçası silinmiş yan dosyaları temizle
+        for filename in sidecars:
+            suffix = next(sfx for sfx in SIDECAR_SUFFIXES if filename.endswith(sfx))
+            if filename[:-len(suffix)] not in entries:
+                try:
+                    os.remove(os.path.join(self.root, filename))
+                except OSError:
+                    pass
+
+        self.entries = entries
+        self.total_bytes = sum(e["size"] for e in entries.values())
+        # Açılışta bu odanın kuyruğu henüz boş (durum yüklemeden önce çağrılır)
+        self._evict_locked(in_use=frozenset())
+        self._save()
+
+    def _read_index(self) -> dict:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("entries", {})
+        except (OSError, ValueError):
+            return {}
+
+    def _merge_from_disk(self):
+        """
+        Diğer süreçlerin index değişikliklerini al (kilit altında çağrılır).
+        Yeni eklenenler katılır, başkasının sildiği dosyalar unutulur,
+        ortak kayıtlarda en güncel kullanım bilgisi tutulur.
+        """
+        stored = self._read_index()
+        for key, disk_entry in stored.items():
+            entry = self.entries.get(key)
+            if entry is None:
+                if os.path.exists(os.path.join(self.root, disk_entry["file"])):
+                    self.entries[key] = dict(disk_entry)
+            else:
+                entry["last_used"] = max(entry["last_used"], disk_entry.get("last_used", 0))
+                entry["hits"] = max(entry["hits"], disk_entry.get("hits", 0))
+
+        for key in [k for k in self.entries if k not in stored]:
+            if not os.path.exists(os.path.join(self.root, self.entries[key]["file"])):
+                del self.entries[key]
+        self.total_bytes = sum(e["size"] for e in self.entries.values())
+
+    async def refresh(self):
+        """Diğer odaların eklediği/sildiği dosyaları görmek için index'i yeniden oku."""
+        await asyncio.to_thread(self._refresh)
+
+    def _refresh(self):
+        with self._locked():
+            self._merge_from_disk()
+
+    async def flush(self):
+        """Bekleyen kullanım bilgisini hemen yaz (kapanışta)."""
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+        if self._usage_dirty:
+            await asyncio.to_thread(self._save_usage)
+
+    def _schedule_usage_flush(self):
+        self._usage_dirty = True
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_usage_later())
+
+    async def _flush_usage_later(self):
+        await asyncio.sleep(USAGE_FLUSH_DELAY)
+        await asyncio.to_thread(self._save_usage)
+
+    def _save_usage(self):
+        with self._locked():
+            self._usage_dirty = False
+            # Birleştirme, bellekteki daha yeni kullanım bilgisini korur
+            self._merge_from_disk()
+            self._save()
+
+    def _save(self):
+        """Index'i atomik olarak diske yaz (kilit altında çağrılır)."""
+        tmp_path = self.index_path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"entries": self.entries}, f)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"⚠️  Önbellek index'i yazılamadı: {e}")
+
+    # ── Erişim ───────────────────────────────────────────────
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Önbellekte varsa dosya yolunu döndür ve kullanım bilgisini güncelle.
+        Kilit alınmaz; kullanım bilgisi kısa bir gecikmeyle toplu yazılır.
+        (Başka odanın sildiği kayıt bir sonraki birleştirmede unutulur.)
+        """
+        entry = self.entries.get(key)
+        if not entry:
+            return None
+
+        path = os.path.join(self.root, entry["file"])
+        if not os.path.exists(path):
+            return None
+
+        entry["last_used"] = time.time()
+        entry["hits"] += 1
+        self._schedule_usage_flush()
+        return path
+
+    def peek(self, key: str) -> Optional[str]:
+        """Kullanım bilgisini değiştirmeden dosya yolunu döndür (yoksa None)."""
+        entry = self.entries.get(key)
+        if not entry:
+            return None
+        path = os.path.join(self.root, entry["file"])
+        return path if os.path.exists(path) else None
+
+    async def put(self, key: str, path: str) -> str:
+        """
+        Yeni indirilen dosyayı önbelleğe kaydet, gerekirse yer aç.
+        Çağıran key_lock(key)'i tutuyor olmalıdır; kilit dosyası burada silinir.
+        """
+        return await asyncio.to_thread(self._put, key, path, self._local_in_use())
+
+    def _put(self, key: str, path: str, in_use: FrozenSet[str]) -> str:
+        with self._locked():
+            self._merge_from_disk()
+            if key in self.entries:
+                self.total_bytes -= self.entries[key]["size"]
+
+            size = os.path.getsize(path)
+            self.entries[key] = {
+                "file": os.path.basename(path),
+                "size": size,
+                "last_used": time.time(),
+                "hits": 1,
+            }
+            self.total_bytes += size
+            self._evict_locked(keep=key, in_use=in_use)
+            self._save()
+        # Parça önbellekte: anahtar kilidine artık gerek yok (her video için dosya birikmesin)
+        self.key_lock(key).remove()
+        return path
+
+    async def evict(self, keep: Optional[str] = None) -> int:
+        """Bütçe aşılmışsa en eski kullanılan dosyaları sil. Silinen dosya sayısını döndürür."""
+        return await asyncio.to_thread(self._evict, keep, self._local_in_use())
+
+    def _evict(self, keep: Optional[str], in_use: FrozenSet[str]) -> int:
+        with self._locked():
+            self._merge_from_disk()
+            return self._evict_locked(keep, in_use)
+
+    def _evict_locked(self, keep: Optional[str] = None, in_use: FrozenSet[str] = frozenset()) -> int:
+        """in_use: bu odanın kullandığı dosya adları (event loop'ta toplanmış)."""
+        if self.total_bytes <= self.max_bytes:
+            return 0
+
+        removed = 0
+        used_elsewhere = self._in_use_by_others()
+        for key in sorted(self.entries, key=lambda k: self.entries[k]["last_used"]):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+
+            path = os.path.join(self.root, self.entries[key]["file"])
+            if self.entries[key]["file"] in in_use or self.entries[key]["file"] in used_elsewhere:
+                continue
+
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except OSError as e:
+                print(f"⚠️  Önbellekten silinemedi ({path}): {e}")
+                continue
+
+            for suffix in SIDECAR_SUFFIXES:
+                try:
+                    os.remove(os.path.join(self.root, key + suffix))
+                except OSError:
+                    pass
+
+            # Kalmış anahtar kilidi: sadece şu an kimse tutmuyorsa sil
+            key_lock = self.key_lock(key)
+            if key_lock.acquire(blocking=False):
+                key_lock.remove()
+                key_lock.release()
+
+            self._forget(key)
+            removed += 1
+
+        if removed:
+            print(f"🧹  Önbellekten {removed} dosya çıkarıldı ({self.total_bytes // (1024 * 1024)} MB kaldı)")
+            self._save()
+        return removed
+
+    def _forget(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry:
+            self.total_bytes -= entry["size"]
+
+
+def _pid_alive(pid: int) -> Optional[bool]:
+    """Süreç çalışıyor mu? Anlaşılamıyorsa None (Windows'ta psutil yoksa)."""
+    if psutil is not None:
+        return psutil.pid_exists(pid)
+    if os.name == "nt":
+        return None   # os.kill(pid, 0) Windows'ta süreci sonlandırır
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True   # Başka kullanıcının süreci (EPERM) — çalışıyor
+    return True
@@ -4,48 +4,130 @@
 
 import asyncio
 import os
-import json
-import hashlib
+import re
 import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from audio_cache import AudioCache, AUDIO_EXTENSIONS
+from loudness import ensure_loudness, load_loudness, gain_db
+from metadata_cache import (
+    MetadataCache, cache_key, canonical_url, canonical_playlist_url, extract_playlist_id,
+)
+from ytdlp_pool import ytdlp_pool, METADATA_TIMEOUT, DOWNLOAD_TIMEOUT, PLAYLIST_PAGE_TIMEOUT
+from rooms import current_room
+import metrics
 
 DOWNLOADS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "downloads")
 os.makedirs(DOWNLOADS_DIR, exist_ok=True)
 
+# Ses modu — MEETBOT_AUDIO_MODE:
+#   "mp3"    : ffmpeg ile MP3'e dönüştür (varsayılan, evrensel uyumluluk)
+#   "native" : YouTube'un kendi ses akışını (opus/webm, m4a) olduğu gibi sakla.
+#              Yeniden kodlama yok; Chrome bu formatları doğrudan çalar.
+AUDIO_MODE = os.environ.get("MEETBOT_AUDIO_MODE", "mp3").lower()
+
+# Kademeli oynatma: indirme sürerken büyüyen dosyayı /stream üzerinden çal.
+# Sadece "native" modda mümkün (mp3 dönüşümü indirme bittikten sonra yapılır).
+PROGRESSIVE_PLAYBACK = AUDIO_MODE == "native" and os.environ.get("MEETBOT_PROGRESSIVE", "1") == "1"
+STREAM_MIN_BYTES = 192 * 1024    # Çalmaya başlamadan önce tamponlanacak veri
+STREAM_CHUNK_BYTES = 64 * 1024
+STREAM_IDLE_TIMEOUT = 30         # Dosya bu kadar saniye büyümezse akışı bitir
+
+STREAM_MEDIA_TYPES = {
+    "mp3": "audio/mpeg",
+    "m4a": "audio/mp4",
+    "mp4": "audio/mp4",
+    "webm": "audio/webm",
+    "opus": "audio/ogg",
+    "ogg": "audio/ogg",
+}
+
+# Tek seferde eklenebilecek maksimum oynatma listesi uzunluğu
+PLAYLIST_LIMIT = int(os.environ.get("MEETBOT_PLAYLIST_LIMIT", "500"))
+_UNAVAILABLE_TITLES = ("[Private video]", "[Deleted video]")
+
+_KEY_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Yeniden başlatmalar arasında korunan, odalar arasında ortak ses önbelleği
+audio_cache = AudioCache(DOWNLOADS_DIR, owner=current_room().name)
+
+# Video ID anahtarlı şarkı bilgisi önbelleği (get_metadata ve download_audio ortak kullanır)
+metadata_cache = MetadataCache(os.path.join(DOWNLOADS_DIR, "metadata.json"))
+
 
 async def get_metadata(url: str) -> dict:
     """
     YouTube linkinden şarkı adı ve süresini çeker (indirmeden).
     Dönen dict: {"title": str, "duration": int (saniye), "duration_str": str}
+    Aynı videonun farklı linkleri aynı önbellek kaydını kullanır.
     """
-    cmd = [
-        "yt-dlp",
-        "--no-download",
-        "--print", "%(title)s",
-        "--print", "%(duration)s",
-        "--no-warnings",
-        "--no-playlist",
-        "--encoding", "utf-8",
-        url,
-    ]
-
-    proc = await asyncio.create_subprocess_exec(
-        *cmd,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-    )
-    stdout, stderr = await proc.communicate()
-
-    if proc.returncode != 0:
-        raise RuntimeError(f"yt-dlp metadata hatası: {stderr.decode('utf-8', errors='replace').strip()}")
-
-    lines = stdout.decode('utf-8', errors='ignore').strip().split("\n")
-    if len(lines) < 2:
-        raise RuntimeError("yt-dlp beklenmeyen çıktı formatı")
-
-    title = lines[0].strip()
+    key = cache_key(url)
+    cached = metadata_cache.get(key)
+    if cached:
+        return cached
+
     try:
-        duration = int(float(lines[1].strip()))
-    except ValueError:
+        with metrics.metadata_seconds.time():
+            info = await ytdlp_pool.run("metadata", {"url": canonical_url(url)}, METADATA_TIMEOUT)
+    except RuntimeError as e:
+        raise RuntimeError(f"yt-dlp metadata hatası: {e}")
+
+    metadata = _build_metadata(info)
+    metadata_cache.put(key, metadata)
+    # Bilgi dict'ini indirme adımı için sakla (video ikinci kez çözümlenmesin)
+    metadata_cache.put_info(key, info)
+    return metadata
+
+
+def track_gain_db(url: str, path: Optional[str]) -> float:
+    """Parçanın önceden hesaplanmış ses yüksekliği kazancı (analiz yoksa 0 dB)."""
+    if not path:
+        return 0.0
+    return gain_db(load_loudness(path, cache_key(url)))
+
+
+async def analyze_track(url: str, path: str) -> float:
+    """Parçanın ses yüksekliğini (gerekirse) analiz et ve kazancı döndür."""
+    return gain_db(await ensure_loudness(path, cache_key(url)))
+
+
+def is_playlist_url(url: str) -> bool:
+    return extract_playlist_id(url) is not None
+
+
+async def iter_playlist(url: str) -> AsyncIterator[List[dict]]:
+    """
+    Oynatma listesini düz çözümleyip girdileri partiler halinde döndürür.
+    Her girdi: {"url", "title", "duration", "duration_str"} — tam bilgi
+    (format listesi vb.) çekilmez, şarkı sırası gelince çözümlenir.
+    """
+    pages = ytdlp_pool.stream("playlist", {
+        "url": canonical_playlist_url(url),
+        "limit": PLAYLIST_LIMIT,
+    }, PLAYLIST_PAGE_TIMEOUT)
+    try:
+        async for batch in pages:
+            entries = []
+            for entry in batch:
+                if entry.get("title") in _UNAVAILABLE_TITLES:
+                    continue
+                entry_url = canonical_url(entry["url"])
+                if entry.get("id") and not entry_url.startswith("http"):
+                    entry_url = canonical_url(f"https://youtu.be/{entry['id']}")
+                entries.append({"url": entry_url, **_build_metadata(entry)})
+            yield entries
+    except RuntimeError as e:
+        raise RuntimeError(f"yt-dlp oynatma listesi hatası: {e}")
+    finally:
+        await pages.aclose()
+
+
+def _build_metadata(info: dict) -> dict:
+    """yt-dlp bilgisinden {"title", "duration", "duration_str"} dict'i oluşturur."""
+    title = (info.get("title") or "").strip()
+    try:
+        duration = int(float(info.get("duration") or 0))
+    except (TypeError, ValueError):
         duration = 0
 
     # Süreyi mm:ss formatına çevir
@@ -59,46 +141,191 @@ async def get_metadata(url: str) -> dict:
     }
 
 
-async def download_audio(url: str) -> str:
+class _InFlight:
+    """Aynı anahtar için süren tek indirme ve onu bekleyenlerin sayısı."""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+# key -> süren indirme (aynı video için ikinci bir yt-dlp süreci açılmasın)
+_inflight: Dict[str, _InFlight] = {}
+metrics.inflight_downloads.set_function(lambda: len(_inflight))
+
+
+def is_downloading(key: str) -> bool:
+    return key in _inflight
+
+
+async def download_audio(url: str, info: Optional[dict] = None) -> str:
     """
-    YouTube linkinden sesi indirir, opus formatında kaydeder.
+    YouTube linkinden sesi indirir; AUDIO_MODE'a göre mp3'e dönüştürür
+    veya orijinal ses akışını (opus/webm, m4a) olduğu gibi kaydeder.
+    info verilmezse get_metadata() adımında saklanan bilgi dict'i kullanılır.
+    Aynı video için eşzamanlı çağrılar tek bir indirmeyi ortaklaşa bekler;
+    bekleyenlerin hepsi vazgeçerse indirme iptal edilir.
     Dönen değer: dosya yolu (str)
     """
-    # URL'den benzersiz dosya adı oluştur
-    url_hash = hashlib.md5(url.encode()).hexdigest()[:10]
-    output_template = os.path.join(DOWNLOADS_DIR, f"{url_hash}.%(ext)s")
+    # URL'den benzersiz dosya adı oluştur (aynı video -> aynı anahtar)
+    key = cache_key(url)
 
-    # Daha önce indirilmiş mi kontrol et
-    for ext in ["mp3", "m4a", "opus", "webm"]:
-        candidate = os.path.join(DOWNLOADS_DIR, f"{url_hash}.{ext}")
-        if os.path.exists(candidate):
-            return candidate
-
-    cmd = [
-        "yt-dlp",
-        "-x",                          # Sadece ses
-        "--audio-format", "mp3",        # MP3 formatı (evrensel uyumluluk)
-        "--audio-quality", "0",         # En iyi kalite
-        "-o", output_template,
-        "--no-playlist",
-        "--no-warnings",
-        url,
-    ]
-
-    proc = await asyncio.create_subprocess_exec(
-        *cmd,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
-    )
-    stdout, stderr = await proc.communicate()
-
-    if proc.returncode != 0:
-        raise RuntimeError(f"yt-dlp indirme hatası: {stderr.decode('utf-8', errors='replace').strip()}")
-
-    # İndirilen dosyayı bul
-    for ext in ["mp3", "m4a", "opus", "webm", "ogg"]:
-        candidate = os.path.join(DOWNLOADS_DIR, f"{url_hash}.{ext}")
+    # Daha önce indirilmiş mi kontrol et (önbellek)
+    cached = audio_cache.get(key)
+    if cached:
+        return cached
+
+    flight = _inflight.get(key)
+    if flight is None:
+        flight = _InFlight(asyncio.create_task(_download(key, url, info)))
+        _inflight[key] = flight
+        flight.task.add_done_callback(lambda _t, f=flight: _finish_flight(key, f))
+
+    flight.waiters += 1
+    try:
+        return await asyncio.shield(flight.task)
+    except asyncio.CancelledError:
+        if flight.waiters <= 1 and not flight.task.done():
+            flight.task.cancel()
+            _finish_flight(key, flight)
+        raise
+    finally:
+        flight.waiters -= 1
+
+
+def _finish_flight(key: str, flight: _InFlight):
+    if _inflight.get(key) is flight:
+        del _inflight[key]
+
+
+async def _download(key: str, url: str, info: Optional[dict]) -> str:
+    """
+    Aynı parçayı başka bir oda süreci indiriyorsa onun bitmesini bekle
+    (süren indirme /stream ile yine de çalınabilir), sonra önbelleğe bak.
+    Kilit thread'de beklenir; aynı süreçteki bekleyenler _inflight'a bağlanır.
+    """
+    lock = audio_cache.key_lock(key)
+    await lock.acquire_async()
+    try:
+        await audio_cache.refresh()
+        cached = audio_cache.get(key)
+        if cached:
+            lock.remove()   # Diğer oda indirdi; kilit dosyası bırakılmasın
+            return cached
+        return await _download_locked(key, url, info)
+    finally:
+        lock.release()
+
+
+async def _download_locked(key: str, url: str, info: Optional[dict]) -> str:
+    """Asıl indirme: yt-dlp işçisinde indir ve önbelleğe kaydet."""
+    output_template = os.path.join(DOWNLOADS_DIR, f"{key}.%(ext)s")
+
+    if info is None:
+        info = metadata_cache.get_info(key)
+
+    try:
+        with metrics.download_seconds.time():
+            info = await ytdlp_pool.run("download", {
+                "url": canonical_url(url),
+                "outtmpl": output_template,
+                "info": info,
+                "mode": AUDIO_MODE,
+            }, DOWNLOAD_TIMEOUT)
+    except RuntimeError as e:
+        raise RuntimeError(f"yt-dlp indirme hatası: {e}")
+
+    # Dosya artık önbellekte, format listesine gerek kalmadı
+    metadata_cache.drop_info(key)
+
+    # Metadata henüz önbellekte yoksa indirme sonucundan kaydet
+    if metadata_cache.get(key) is None and info.get("title"):
+        metadata_cache.put(key, _build_metadata(info))
+
+    # İndirilen dosyayı bul ve önbelleğe kaydet
+    for ext in AUDIO_EXTENSIONS:
+        candidate = os.path.join(DOWNLOADS_DIR, f"{key}.{ext}")
         if os.path.exists(candidate):
-            return candidate
+            metrics.download_bytes.observe(os.path.getsize(candidate))
+            return await audio_cache.put(key, candidate)
+
+    raise RuntimeError("İndirme tamamlandı ama dosya bulunamadı")
+
+
+# ──────────────────────────────────────────────────────────────
+#  Kademeli oynatma (indirme sürerken akış)
+# ──────────────────────────────────────────────────────────────
+
+def find_stream_file(key: str) -> Optional[Tuple[str, str, bool]]:
+    """
+    Anahtara ait dosyayı bul: (yol, uzantı, tamamlandı_mı).
+    Tamamlanmış dosya yoksa yt-dlp'nin yazdığı `<key>.<ext>.part` aranır.
+    """
+    if not _KEY_RE.match(key):
+        return None
+
+    for ext in AUDIO_EXTENSIONS:
+        final_path = os.path.join(DOWNLOADS_DIR, f"{key}.{ext}")
+        if os.path.exists(final_path):
+            return final_path, ext, True
+        if os.path.exists(final_path + ".part"):
+            return final_path + ".part", ext, False
+    return None
+
+
+def buffered_bytes(key: str) -> int:
+    """İndirilmekte olan (veya bitmiş) dosyanın diskteki boyutu."""
+    found = find_stream_file(key)
+    if not found:
+        return 0
+    try:
+        return os.path.getsize(found[0])
+    except OSError:
+        return 0
+
+
+def _read_stream_chunk(final_path: str, part_path: str, offset: int) -> Tuple[bytes, bool, bool]:
+    """
+    Akışın sıradaki parçasını oku (thread'de çalışır).
+    Dönen değer: (veri, indirme_tamamlandı_mı, dosya_kayboldu_mu)
+    """
+    complete = not os.path.exists(part_path) and os.path.exists(final_path)
+    path = final_path if complete else part_path
+    try:
+        with open(path, "rb") as f:
+            f.seek(offset)
+            return f.read(STREAM_CHUNK_BYTES), complete, False
+    except OSError:
+        # Yeniden adlandırma anı olabilir; iki dosya da yoksa indirme başarısız/iptal
+        return b"", complete, not os.path.exists(part_path) and not os.path.exists(final_path)
+
+
+async def tail_download(key: str, ext: str) -> AsyncIterator[bytes]:
+    """
+    Büyüyen `.part` dosyasını baştan sona akıt. yt-dlp indirmeyi bitirip
+    dosyayı yeniden adlandırınca son dosyadan devam edilir.
+    Dosya her okumada açılıp kapatılır (Windows'ta yeniden adlandırma engellenmesin).
+    Okuma ve dosya kontrolleri event loop dışında (thread'de) yapılır.
+    """
+    final_path = os.path.join(DOWNLOADS_DIR, f"{key}.{ext}")
+    part_path = final_path + ".part"
+    offset = 0
+    last_growth = time.monotonic()
+
+    while True:
+        chunk, complete, gone = await asyncio.to_thread(_read_stream_chunk, final_path, part_path, offset)
+        if gone:
+            return  # İndirme başarısız oldu / iptal edildi
+
+        if chunk:
+            offset += len(chunk)
+            last_growth = time.monotonic()
+            yield chunk
+            continue
 
-    raise RuntimeError("İndirme tamamlandı ama dosya bulunamadı")
\ No newline at end of file
+        if complete:
+            return
+        if time.monotonic() - last_growth > STREAM_IDLE_TIMEOUT:
+            print(f"⚠️  Akış zaman aşımı, dosya büyümüyor: {key}")
+            return
+        await asyncio.sleep(0.2)
@@ -4,21 +4,45 @@
 
 import asyncio
 import os
+import re
+import time
 import sys
 import subprocess
 import socket
 import platform
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
 
 from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeout
 
+import metrics
+
 # ──────────────────────────────────────────────────────────────
 #  Sabitler
 # ──────────────────────────────────────────────────────────────
 
 CDP_PORT = 9222
+HTTP_PORT = 8000  # Ses dosyalarını sunan (bu odanın) web sunucusu
 PROFIL_DIZINI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chrome_profil")
 SAYFA_YUKLEME_MS = 30_000
 KATILIM_BEKLEME_MS = 120_000  # 2 dakika
+# Katılım adımlarının üst sınırları: koşul gerçekleşince hemen devam edilir
+ARAYUZ_BEKLEME_MS = 20_000    # Meet ön ekranının (katıl butonu) gelmesi
+KONTROL_BEKLEME_MS = 5_000    # Toplantı içi kontrollerin (kamera, menü) belirmesi
+MENU_BEKLEME_MS = 3_000       # Menü / ayarlar penceresinin açılıp kapanması
+SECICI_BEKLEME_MS = 1_000     # Ekranda olması beklenen buton için seçici yarışı
+KATIL_DESENI = re.compile(r"katıl|join", re.IGNORECASE)
+# Sadece toplantı içinde bulunan "ayrıl" butonu (mikrofon/kamera ön ekranda da var)
+AYRIL_SECICILER = [
+    '[aria-label="Görüşmeden ayrıl"]',
+    '[aria-label="Leave call"]',
+    '[data-tooltip="Görüşmeden ayrıl"]',
+    '[data-tooltip="Leave call"]',
+]
+OLAY_BAGLANTISI = "__meetbot_event"  # Sayfanın Python'a olay ilettiği binding
+ILERLEME_ARALIGI_MS = 1000           # timeupdate en fazla bu sıklıkla iletilir
+# Parçalar arası kesişmeli geçiş (saniye, 0 = kapalı — boşluksuz ardışık geçiş)
+GECIS_SURESI_SN = max(0.0, float(os.environ.get("MEETBOT_CROSSFADE", "0")))
 
 # ──────────────────────────────────────────────────────────────
 #  Web Audio API Enjeksiyon Scripti
@@ -44,74 +68,187 @@ AUDIO_INJECT_SCRIPT = """
     musicGain.connect(micGain);
     micGain.connect(dest);
 
+    // Parça başına ses yüksekliği dengeleme: Source -> parça Gain -> Music
+    // Her parçanın kendi gain düğümü var; geçişte biri kısılırken diğeri açılır
+    const dbToGain = (db) => Math.pow(10, (db || 0) / 20);
+    const CROSSFADE = %(crossfade)s;  // saniye (0 → boşluksuz, kesişmesiz geçiş)
+
+    // Olayları Python'a it (expose_binding) — yoklama yok
+    const emit = (event, payload) => {
+        const binding = window.%(binding)s;
+        if (binding) binding(event, payload || {}).catch(() => {});
+    };
+
+    // Parça: ses elemanı + kaynak + gain. Oluşturulunca tamponlamaya başlar.
+    const createTrack = (url, live, gainDb) => {
+        const audio = new Audio();
+        audio.crossOrigin = "anonymous";
+        audio.preload = "auto";
+        audio.src = url;
+
+        const gain = ctx.createGain();
+        gain.gain.value = dbToGain(gainDb);
+        gain.connect(musicGain);
+        const source = ctx.createMediaElementSource(audio);
+        source.connect(gain);
+
+        const track = { url, audio, gain, source, level: dbToGain(gainDb), isReady: false, autoAdvanced: false };
+
+        // canplaythrough bekleyerek senkronizasyon sağla (30sn Timeout)
+        // Akış (indirme sürüyor) halinde tamamı hiç gelmeyebilir, canplay yeterli
+        const readyEvent = live ? "canplay" : "canplaythrough";
+        track.ready = new Promise((resolve, reject) => {
+            const timeout = setTimeout(() => {
+                cleanup();
+                reject(new Error("Audio yükleme zaman aşımı (30sn): " + url));
+            }, 30000);
+
+            const cleanup = () => {
+                clearTimeout(timeout);
+                audio.removeEventListener(readyEvent, onCanPlay);
+                audio.removeEventListener("error", onError);
+            };
+
+            const onCanPlay = () => {
+               cleanup();
+               track.isReady = true;
+               resolve();
+            };
+            const onError = (e) => {
+               cleanup();
+               reject(new Error("Audio yükleme hatası: " + url));
+            };
+
+            audio.addEventListener(readyEvent, onCanPlay);
+            audio.addEventListener("error", onError);
+            audio.load();
+        });
+        track.ready.catch(() => {});  // Ön yüklemede hata: çalınmak istenirse orada ele alınır
+        return track;
+    };
+
+    const disposeTrack = (track) => {
+        if (!track) return;
+        track.audio.pause();
+        track.audio.src = "";
+        track.audio.load();
+        try { track.source.disconnect(); } catch(e) {}
+        try { track.gain.disconnect(); } catch(e) {}
+    };
+
     // Bot Kontrol Nesnesi
     window.__meetbot = {
         ctx, dest, musicGain, micGain,
-        audio: null, source: null, isPlaying: false,
-        
-        async play(url) {
-            console.log("[MeetBot] Çalma isteği:", url);
-            
-            // Temizlik: Eskiyi durdur ve kopar
-            if (this.audio) {
-                this.audio.pause();
-                this.audio.src = "";
-                this.audio.load();
-                this.audio = null;
+        current: null, next: null, audio: null, isPlaying: false,
+
+        async play(url, live = false, gainDb = 0) {
+            console.log("[MeetBot] Çalma isteği:", url, live ? "(akış)" : "", "kazanç:", gainDb, "dB");
+
+            // Motor bu parçaya zaten kendiliğinden geçtiyse (boşluksuz geçiş) tekrar başlatma
+            const cur = this.current;
+            if (cur && cur.autoAdvanced && cur.url === url) {
+                cur.autoAdvanced = false;
+                this.setTrackGain(gainDb);
+                return;
             }
-            if (this.source) {
-                try { this.source.disconnect(); } catch(e) {}
-                this.source = null;
+
+            let track;
+            if (this.next && this.next.url === url) {
+                track = this.next;       // Önceden yüklenmiş parça
+                this.next = null;
+                track.level = dbToGain(gainDb);
+                track.gain.gain.setValueAtTime(track.level, ctx.currentTime);
+            } else {
+                disposeTrack(this.next); // Sıra değişmiş, ipucu eskidi
+                this.next = null;
+                track = createTrack(url, live, gainDb);
             }
 
             if (ctx.state === 'suspended') await ctx.resume();
+            try {
+                await track.ready;
+            } catch (e) {
+                disposeTrack(track);
+                throw e;
+            }
+            await this._switchTo(track, 0);
+            console.log("[MeetBot] Başladı: 48kHz engine aktif.");
+        },
 
-            // Yeni Audio Elementi (Her şarkı için taze başlangıç)
-            const audio = new Audio();
-            audio.crossOrigin = "anonymous";
-            audio.src = url;
-
-            // canplaythrough bekleyerek senkronizasyon sağla (30sn Timeout)
-            await new Promise((resolve, reject) => {
-                const timeout = setTimeout(() => {
-                    cleanup();
-                    reject(new Error("Audio yükleme zaman aşımı (30sn): " + url));
-                }, 30000);
-
-                const cleanup = () => {
-                    clearTimeout(timeout);
-                    audio.removeEventListener("canplaythrough", onCanPlay);
-                    audio.removeEventListener("error", onError);
-                };
-
-                const onCanPlay = () => {
-                   cleanup();
-                   resolve();
-                };
-                const onError = (e) => {
-                   cleanup();
-                   reject(new Error("Audio yükleme hatası: " + url));
-                };
-                
-                audio.addEventListener("canplaythrough", onCanPlay);
-                audio.addEventListener("error", onError);
-                audio.load();
-            });
+        // Sunucunun ipucu: sıradaki parçayı şimdiden tamponla (url boş → ipucunu kaldır)
+        preload(url, gainDb = 0) {
+            if (this.next && this.next.url === url) return;
+            disposeTrack(this.next);
+            this.next = url ? createTrack(url, false, gainDb) : null;
+        },
 
-            const source = ctx.createMediaElementSource(audio);
-            source.connect(musicGain);
+        // Çalan parça bitiyor/bitti: hazır bekleyen parçaya hemen geç
+        _advance() {
+            const next = this.next;
+            if (!next || !next.isReady) return false;
+            const finished = this.current;
+            this.next = null;
+            next.autoAdvanced = true;
+            this._switchTo(next, CROSSFADE).then(
+                () => emit("ended", { advanced: true, url: next.url }),
+                (e) => {
+                    // Biten parça yine de bitti; başlatılamayan parça sunucunun
+                    // play(url) komutuyla baştan denenir (autoAdvanced kısayolu olmadan)
+                    next.autoAdvanced = false;
+                    if (this.current === next) this.isPlaying = false;
+                    emit("ended", { url: finished ? finished.url : null, failed: next.url, message: String(e) });
+                }
+            );
+            return true;
+        },
 
-            this.audio = audio;
-            this.source = source;
+        async _switchTo(track, fade) {
+            const old = this.current;
+            this.current = track;
+            this.audio = track.audio;
             this.isPlaying = true;
+            this._watch(track);
+
+            if (old && fade > 0) {
+                const t = ctx.currentTime;
+                old.gain.gain.cancelScheduledValues(t);
+                old.gain.gain.setValueAtTime(old.gain.gain.value, t);
+                old.gain.gain.linearRampToValueAtTime(0, t + fade);
+                track.gain.gain.setValueAtTime(0, t);
+                track.gain.gain.linearRampToValueAtTime(track.level, t + fade);
+                setTimeout(() => disposeTrack(old), fade * 1000 + 100);
+            } else {
+                disposeTrack(old);
+            }
+            await track.audio.play();
+        },
 
-            audio.onended = () => {
+        _watch(track) {
+            // Sadece çalan parçanın olayları iletilir (değiştirilen eskiler susar)
+            const audio = track.audio;
+            const current = () => this.current === track;
+            let lastProgress = 0;
+            audio.addEventListener("ended", () => {
+                if (!current() || this._advance()) return;
                 this.isPlaying = false;
-                window.__meetbot_song_ended = true;
-            };
-
-            await audio.play();
-            console.log("[MeetBot] Başladı: 48kHz engine aktif.");
+                emit("ended");
+            });
+            audio.addEventListener("error", () => {
+                if (!current()) return;
+                this.isPlaying = false;
+                emit("error", { message: (audio.error && audio.error.message) || "Ses hatası", url: track.url });
+            });
+            audio.addEventListener("stalled", () => { if (current()) emit("stalled", { url: track.url }); });
+            audio.addEventListener("timeupdate", () => {
+                if (!current()) return;
+                const d = audio.duration;
+                // Geçiş kesişmeli ise parça bitmeden sıradakine başla
+                if (CROSSFADE > 0 && isFinite(d) && d - audio.currentTime <= CROSSFADE && this._advance()) return;
+                const now = performance.now();
+                if (now - lastProgress < %(progress_ms)d) return;
+                lastProgress = now;
+                emit("timeupdate", { current: audio.currentTime || 0, total: isFinite(d) ? d : 0 });  // Akışta süre Infinity olur
+            });
         },
 
         stop() {
@@ -121,10 +258,23 @@ AUDIO_INJECT_SCRIPT = """
 
         pause() { if (this.audio) this.audio.pause(); },
         resume() { if (this.audio) this.audio.play(); },
+        setTrackGain(db) {
+            if (!this.current) return;
+            this.current.level = dbToGain(db);
+            this.current.gain.gain.setTargetAtTime(this.current.level, ctx.currentTime, 0.5);
+        },
         setMusicVolume(v) { musicGain.gain.setTargetAtTime(v/100, ctx.currentTime, 0.01); },
         setMicVolume(v) { micGain.gain.setTargetAtTime(v/100, ctx.currentTime, 0.01); }
     };
 
+    // Python'dan gelen komutlar için sabit giriş noktası: argümanlar JSON
+    // olarak gelir, sadece listedeki metotlar çağrılabilir
+    const RPC_METHODS = ["play", "preload", "stop", "pause", "resume", "setTrackGain", "setMusicVolume", "setMicVolume"];
+    window.__meetbot_rpc = (method, args) => {
+        if (!RPC_METHODS.includes(method)) throw new Error("Bilinmeyen komut: " + method);
+        return window.__meetbot[method](...(args || []));
+    };
+
     // 2. getUserMedia Patch (DefineProperty ile sarsılmaz hale getir)
     const origGUM = navigator.mediaDevices.getUserMedia.bind(navigator.mediaDevices);
     const patchGUM = async function(constraints) {
@@ -160,7 +310,7 @@ AUDIO_INJECT_SCRIPT = """
 
     console.log("[MeetBot] Patch tamamlandı.");
 })();
-"""
+""" % {"binding": OLAY_BAGLANTISI, "progress_ms": ILERLEME_ARALIGI_MS, "crossfade": GECIS_SURESI_SN}
 
 
 # ──────────────────────────────────────────────────────────────
@@ -192,6 +342,27 @@ def chrome_yolunu_bul() -> str:
     raise FileNotFoundError("Chrome veya Edge bulunamadı!")
 
 
+class KatilimRaporu:
+    """Katılım adımlarının sürelerini ölçer ve sonunda tek satırda raporlar."""
+
+    def __init__(self):
+        self.baslangic = time.perf_counter()
+        self.adimlar: List[Tuple[str, float]] = []
+
+    @contextmanager
+    def adim(self, ad: str):
+        basla = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.adimlar.append((ad, time.perf_counter() - basla))
+
+    def yazdir(self):
+        toplam = time.perf_counter() - self.baslangic
+        detay = ", ".join(f"{ad} {sure:.1f}" for ad, sure in self.adimlar)
+        print(f"⏱️  Katılım süresi: {toplam:.1f} sn ({detay})")
+
+
 def port_kullaniliyormu(port: int) -> bool:
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
         return s.connect_ex(("127.0.0.1", port)) == 0
@@ -202,23 +373,120 @@ def port_kullaniliyormu(port: int) -> bool:
 # ──────────────────────────────────────────────────────────────
 
 class MeetBot:
-    def __init__(self):
+    def __init__(self, cdp_port: int = CDP_PORT, profile_dir: str = PROFIL_DIZINI,
+                 kill_stray_chrome: bool = True, http_port: int = HTTP_PORT):
+        # Birden çok oda aynı makinede çalışırken her botun kendi portu ve profili olur
+        self.cdp_port = cdp_port
+        self.http_port = http_port
+        self.profile_dir = profile_dir
+        # Yeniden başlatmada tüm chrome.exe'leri öldür (sadece tek oda varken güvenli)
+        self.kill_stray_chrome = kill_stray_chrome
         self.playwright = None
         self.browser = None
         self.context = None
         self.page = None
         self.chrome_process = None
-        self._song_ended_check_task = None
+        self._binding_context = None  # Olay binding'i ve init script'in kayıtlı olduğu bağlam
+        self._engine_ready = False    # Geçerli dokümanda ses motoru doğrulandı mı?
+        # Arama anahtarı -> bu Meet dili/arayüzünde işe yarayan seçici
+        self._kazanan_seciciler: Dict[str, str] = {}
         self._on_song_ended = None  # Callback
+        self._on_song_error = None  # Callback (mesaj)
         self._on_progress = None    # Callback (current, total)
 
+    async def _evaluate(self, expression: str, arg=None, metric: Optional["metrics.Histogram"] = None):
+        """page.evaluate — süresi verilen histograma (varsayılan: gidiş-dönüş) yazılır."""
+        with (metric or metrics.page_evaluate_seconds).time():
+            return await self.page.evaluate(expression, arg)
+
+    async def _bekle(self, hedef, timeout_ms: int, state: str = "visible") -> bool:
+        """
+        Seçici (str) veya locator istenen duruma gelene kadar bekle.
+        Sadece görünür eşleşmelere bakılır: "visible" → görünür biri var,
+        "hidden" → hiç görünür eşleşme kalmadı. Süre dolarsa False döner.
+        """
+        locator = self.page.locator(hedef) if isinstance(hedef, str) else hedef
+        try:
+            # Gizli bir kopya (ör. ekran dışı buton) ilk eşleşme olsa bile görünen beklenir
+            await locator.filter(visible=True).first.wait_for(state=state, timeout=timeout_ms)
+            return True
+        except PlaywrightTimeout:
+            return False
+
+    async def _secici_yarisi(self, anahtar: str, adaylar: List[str], timeout_ms: int):
+        """
+        Aday seçicilerin hepsini aynı anda (tek birleşik sorguyla) bekle ve
+        görünür olanlardan ilkini döndür: (seçici, locator) veya None.
+        Kazanan anahtar altında hatırlanır, sonraki aramalarda önce o denenir.
+        """
+        kazanan = self._kazanan_seciciler.get(anahtar)
+        sirali = sorted(adaylar, key=lambda aday: aday != kazanan)
+
+        birlesik = self.page.locator(sirali[0])
+        for aday in sirali[1:]:
+            birlesik = birlesik.or_(self.page.locator(aday))
+        if not await self._bekle(birlesik, timeout_ms):
+            return None
+
+        # Hangisi eşleşti? Bekleme yok, hepsi paralel kontrol edilir
+        adaylar_gorunur = [self.page.locator(aday).filter(visible=True).first for aday in sirali]
+        gorunurler = await asyncio.gather(
+            *(locator.is_visible() for locator in adaylar_gorunur),
+            return_exceptions=True,
+        )
+        for aday, locator, gorunur in zip(sirali, adaylar_gorunur, gorunurler):
+            if gorunur is True:
+                self._kazanan_seciciler[anahtar] = aday
+                return aday, locator
+        return None
+
+    def _set_page(self, page):
+        """
+        Aktif sekmeyi değiştir. Ana çerçeve başka bir dokümana geçtiğinde
+        veya sekme çöktüğünde ses motorunun yeniden doğrulanması gerekir.
+        """
+        self.page = page
+        self._engine_ready = False
+        if page is None:
+            return
+
+        def invalidate(*_):
+            if self.page is page:
+                self._engine_ready = False
+
+        page.on("framenavigated", lambda frame: frame == page.main_frame and invalidate())
+        page.on("crash", invalidate)
+
+    async def _ensure_engine(self):
+        """
+        Ses motoru bu dokümanda yoksa kur. Normalde init script zaten kurmuştur;
+        doğrulama doküman başına bir kez yapılır, script sadece gerekirse gönderilir.
+        """
+        if self._engine_ready:
+            return
+        installed = await self._evaluate("typeof window.__meetbot_rpc === 'function'")
+        if not installed:
+            await self._evaluate(AUDIO_INJECT_SCRIPT)
+        self._engine_ready = True
+
+    async def _rpc(self, method: str, *args):
+        """Ses motorunda bir komut çalıştır (argümanlar JSON olarak gider)."""
+        await self._ensure_engine()
+        try:
+            # play parçanın tamponlanmasını bekler (30 sn'ye kadar): CDP gidiş-dönüşüne katılmaz
+            metric = metrics.page_play_seconds if method == "play" else None
+            return await self._evaluate("([m, a]) => window.__meetbot_rpc(m, a)", [method, list(args)], metric)
+        except Exception:
+            self._engine_ready = False  # Doküman değişmiş olabilir, bir dahaki sefere doğrula
+            raise
+
     async def start_chrome(self):
         """Chrome'u debug modunda başlat."""
         chrome_yolu = chrome_yolunu_bul()
-        os.makedirs(PROFIL_DIZINI, exist_ok=True)
+        os.makedirs(self.profile_dir, exist_ok=True)
 
-        if port_kullaniliyormu(CDP_PORT):
-            print(f"⚠️  Port {CDP_PORT} zaten kullanımda, mevcut Chrome'a bağlanılıyor...")
+        if port_kullaniliyormu(self.cdp_port):
+            print(f"⚠️  Port {self.cdp_port} zaten kullanımda, mevcut Chrome'a bağlanılıyor...")
             return
 
         silence_wav = os.path.abspath(os.path.join(os.path.dirname(__file__), "silence.wav"))
@@ -238,8 +506,8 @@ class MeetBot:
 
         args = [
             chrome_yolu,
-            f"--remote-debugging-port={CDP_PORT}",
-            f"--user-data-dir={PROFIL_DIZINI}",
+            f"--remote-debugging-port={self.cdp_port}",
+            f"--user-data-dir={self.profile_dir}",
             "--no-sandbox",
             "--disable-dev-shm-usage",
             "--disable-gpu",
@@ -265,7 +533,7 @@ class MeetBot:
 
         # Chrome'un başlamasını bekle
         for _ in range(30):
-            if port_kullaniliyormu(CDP_PORT):
+            if port_kullaniliyormu(self.cdp_port):
                 break
             await asyncio.sleep(0.5)
         else:
@@ -278,28 +546,27 @@ class MeetBot:
         self.playwright = await async_playwright().start()
         print(f"🔗  Chrome'a CDP bağlantısı kuruluyor...")
         self.browser = await self.playwright.chromium.connect_over_cdp(
-            f"http://127.0.0.1:{CDP_PORT}"
+            f"http://127.0.0.1:{self.cdp_port}"
         )
         self.context = self.browser.contexts[0]
 
         # Mevcut sayfaları kontrol et, yoksa yarat
         pages = self.context.pages
         if pages:
-            self.page = pages[0]
+            self._set_page(pages[0])
         else:
-            self.page = await self.context.new_page()
+            self._set_page(await self.context.new_page())
 
         print("✅  Playwright bağlantısı kuruldu.")
 
     async def _ensure_page(self):
         """Meet katılımı öncesi sekmeyi temizleyip hazırlar."""
         if not self.page or self.page.is_closed():
-            self.page = await self.context.new_page()
+            self._set_page(await self.context.new_page())
             
         # Eskiyi temizle (RAM boşaltır, SIGTRAP ihtimalini azaltır)
         try:
             await self.page.goto("about:blank")
-            await self.page.wait_for_timeout(500)
         except Exception:
             pass
         
@@ -310,10 +577,13 @@ class MeetBot:
         except Exception as e:
             print(f"⚠️  Stealth uygulanamadı: {e}")
 
-        # Web Audio API enjeksiyonunu init script olarak ekle
-        await self.context.add_init_script(AUDIO_INJECT_SCRIPT)
-        print("✅  Audio Injection Script (Init) eklendi.")
-        await self.page.add_init_script(AUDIO_INJECT_SCRIPT)
+        # Olay binding'i ve Web Audio init script'i bağlam başına bir kez eklenir;
+        # bağlamdaki her yeni doküman motoru kendisi kurar
+        if self._binding_context is not self.context:
+            await self.context.expose_binding(OLAY_BAGLANTISI, self._on_page_event)
+            await self.context.add_init_script(AUDIO_INJECT_SCRIPT)
+            self._binding_context = self.context
+            print("✅  Audio Injection Script (Init) eklendi.")
         print("✅  Yeni temiz sekme hazır (SIGTRAP koruması).")
 
     async def _full_browser_restart(self):
@@ -336,13 +606,15 @@ class MeetBot:
         except: pass
         
         # Windows sunucuda zombi process kalmaması için garanti temizlik
-        if platform.system() == "Windows":
+        # (başka odaların Chrome'ları varken hepsini öldürme)
+        if platform.system() == "Windows" and self.kill_stray_chrome:
             print("🧹  Olası zombi Chrome işlemleri temizleniyor...")
             os.system("taskkill /F /IM chrome.exe >nul 2>&1")
         
         self.browser = None
         self.context = None
-        self.page = None
+        self._binding_context = None
+        self._set_page(None)
         self.playwright = None
         self.chrome_process = None
         
@@ -358,12 +630,12 @@ class MeetBot:
                 await self.page.close()
             except Exception:
                 pass
-        self.page = None
+        self._set_page(None)
         
         try:
             await self._ensure_page()
             # Basit bir evaluate ile sayfanın sağlığını doğrula
-            await self.page.evaluate("1 + 1")
+            await self._evaluate("1 + 1")
         except Exception as e:
             print(f"⚠️  Sekme oluşturulamadı, tarayıcı/bağlam arızalı olabilir ({e}). Yeni tarayıcı başlatılacak...")
             await self._full_browser_restart()
@@ -383,10 +655,9 @@ class MeetBot:
                     reload_basarili = False
                     if self.page and not self.page.is_closed():
                         try:
-                            # 1 sn bekle ve çöken sayfadaki "Reload" düğmesini ara
-                            await self.page.wait_for_timeout(1000)
+                            # Çöken sayfadaki "Reload" düğmesini ara
                             reload_btn = self.page.locator('button:has-text("Reload"), button:has-text("Yeniden Yükle")').first
-                            if await reload_btn.is_visible(timeout=2000):
+                            if await self._bekle(reload_btn, 3000):
                                 print("🔄  'Aw, Snap!' tespit edildi. Ekrandaki 'Reload' butonuna basılıyor...")
                                 await reload_btn.click()
                                 await self.page.wait_for_load_state("domcontentloaded", timeout=10000)
@@ -403,95 +674,87 @@ class MeetBot:
 
     async def _join_meet_logic(self, link: str):
         """Asıl Google Meet'e katılma adımları."""
-        await self._ensure_page()
-        
-        print(f"🌐  Meet'e gidiliyor: {link}")
-        await self.page.goto(link, wait_until="domcontentloaded", timeout=SAYFA_YUKLEME_MS)
-
-        # Sayfanın yüklenmesini bekle
-        await self.page.wait_for_timeout(6000)
-
-        # Audio inject script'i çalıştır (sayfa yüklendikten sonra)
+        rapor = KatilimRaporu()
         try:
-            await self.page.evaluate(AUDIO_INJECT_SCRIPT)
-        except Exception:
-            pass
+            await self._join_meet_steps(link, rapor)
+        finally:
+            rapor.yazdir()
 
-        # Katılma butonunu bul ve tıkla
-        print("🔘  Katılma butonu aranıyor...")
-        buton_metinleri = [
-            "Hemen katıl", "Hemen Katıl",
-            "Katılma isteği gönder",
-            "Ask to join", "Şimdi katıl",
-            "Join now", "Katıl", "Join",
-        ]
-
-        buton_tiklandi = False
-        for metin in buton_metinleri:
-            try:
-                buton = self.page.get_by_role("button", name=metin)
-                if await buton.is_visible(timeout=3000):
-                    await buton.click()
-                    buton_tiklandi = True
-                    print(f'✅  "{metin}" butonuna tıklandı.')
-                    break
-            except Exception:
-                continue
+    async def _join_meet_steps(self, link: str, rapor: KatilimRaporu):
+        """Her adım kendi koşulunu (en fazla kendi süre sınırı kadar) bekler."""
+        with rapor.adim("sekme"):
+            await self._ensure_page()
 
-        if not buton_tiklandi:
+        print(f"🌐  Meet'e gidiliyor: {link}")
+        with rapor.adim("sayfa"):
+            await self.page.goto(link, wait_until="domcontentloaded", timeout=SAYFA_YUKLEME_MS)
+
+        # Meet ön ekranının gelmesini bekle: katıl butonu ya da (doğrudan alındıysa)
+        # ayrıl butonu. Mikrofon/kamera düğmeleri "Hazırlanıyor..." ekranında da
+        # olduğu için burada sayılmaz.
+        ayril_secici = ", ".join(AYRIL_SECICILER)
+        arayuz_sonu = time.monotonic() + ARAYUZ_BEKLEME_MS / 1000
+        with rapor.adim("arayüz"):
+            hazir = self.page.get_by_role("button", name=KATIL_DESENI).or_(
+                self.page.locator(ayril_secici))
+            if not await self._bekle(hazir, ARAYUZ_BEKLEME_MS):
+                print("⚠️  Meet ön ekranı beklenen sürede gelmedi, yine de deneniyor...")
+
+            # Ses motoru init script ile kurulmuş olmalı; değilse şimdi kur
             try:
-                fallback = self.page.locator(
-                    "button:has-text('join'), button:has-text('katıl'), "
-                    "button:has-text('Join'), button:has-text('Katıl'), "
-                    "button:has-text('Hemen')"
-                ).first
-                await fallback.click(timeout=5000)
-                buton_tiklandi = True
-                print("✅  Katılma butonuna (yedek seçici) tıklandı.")
+                await self._ensure_engine()
             except Exception:
                 pass
 
+        # Katılma butonunu bul ve tıkla
+        print("🔘  Katılma butonu aranıyor...")
+        with rapor.adim("buton"):
+            # Ön ekran süresinden kalan bütçe kadar beklenir (en az SECICI_BEKLEME_MS)
+            kalan_ms = int((arayuz_sonu - time.monotonic()) * 1000)
+            buton_tiklandi = await self._katil_butonuna_tikla(max(kalan_ms, SECICI_BEKLEME_MS))
         if not buton_tiklandi:
             raise RuntimeError("Katılma butonu bulunamadı!")
 
         # Toplantıya kabul edilmeyi bekle
         print(f"⏳  Toplantıya kabul bekleniyor (maks {KATILIM_BEKLEME_MS // 1000} sn)...")
 
-        toplanti_ici_seciciler = [
-            '[aria-label="Görüşmeden ayrıl"]',
-            '[aria-label="Leave call"]',
-            '[data-tooltip="Görüşmeden ayrıl"]',
-            '[data-tooltip="Leave call"]',
-            '[aria-label*="ikrofon"]',
-            '[aria-label*="icrophone"]',
-            '[aria-label*="amera"]',
-            '[aria-label="Diğer seçenekler"]',
-            '[aria-label="More options"]',
-        ]
-        birlesik_secici = ", ".join(toplanti_ici_seciciler)
-
-        try:
-            await self.page.wait_for_selector(birlesik_secici, timeout=KATILIM_BEKLEME_MS)
-            print("✅  Bot toplantıya başarıyla katıldı!")
-        except PlaywrightTimeout:
-            raise RuntimeError("Zaman aşımı! Toplantı sahibi onay vermedi.")
+        # Lobi/bekleme ekranında da mikrofon-kamera düğmeleri var; kabul edildiğimizi
+        # sadece toplantı içindeki "ayrıl" butonu gösterir
+        with rapor.adim("kabul"):
+            if not await self._bekle(ayril_secici, KATILIM_BEKLEME_MS):
+                raise RuntimeError("Zaman aşımı! Toplantı sahibi onay vermedi.")
+        print("✅  Bot toplantıya başarıyla katıldı!")
 
         # Toplantı içi: SADECE kamerayı kapat (Mikrofon açık kalmalı)
-        await self.page.wait_for_timeout(2000)
-        await self._kamera_kapat()
-
-        # Audio inject'i tekrar çalıştır (Meet sayfasında)
-        try:
-            await self.page.evaluate(AUDIO_INJECT_SCRIPT)
-        except Exception:
-            pass
+        with rapor.adim("kamera"):
+            await self._kamera_kapat()
 
         # Gürültü gidermeyi kapat
-        await self.page.wait_for_timeout(1000)
-        await self._gurultu_giderme_kapat()
+        with rapor.adim("gürültü giderme"):
+            await self._gurultu_giderme_kapat()
+
+    async def _katil_butonuna_tikla(self, timeout_ms: int = SECICI_BEKLEME_MS) -> bool:
+        """Katılma butonunu bul ve tıkla. Bulunamazsa False."""
+        buton_metinleri = [
+            "Hemen katıl", "Katılma isteği gönder", "Şimdi katıl",
+            "Ask to join", "Join now", "Katıl", "Join",
+        ]
+        # Rol adları büyük/küçük harf duyarsız ve kısmi eşleşir (get_by_role gibi)
+        adaylar = [f'role=button[name="{metin}"]' for metin in buton_metinleri]
+        adaylar.append(
+            "button:has-text('join'), button:has-text('katıl'), button:has-text('Hemen')"
+        )
 
-        # Şarkı bitti kontrolünü başlat
-        self._start_song_ended_checker()
+        bulunan = await self._secici_yarisi("katil", adaylar, timeout_ms)
+        if not bulunan:
+            return False
+        secici, buton = bulunan
+        try:
+            await buton.click()
+        except Exception:
+            return False
+        print(f"✅  Katılma butonuna tıklandı ({secici}).")
+        return True
 
     async def _kamera_kapat(self):
         """Sadece kamerayı kapat (Mikrofon AÇIK kalmalı ki müzik gitsin)."""
@@ -501,15 +764,14 @@ class MeetBot:
             '[aria-label="Turn off camera"]',
             '[data-tooltip*="amerayı kapat"]',
         ]
-        for s in cam_seciciler:
+        # Kamera butonu toplantı ekranı oturunca gelir (zaten kapalıysa hiç gelmez)
+        bulunan = await self._secici_yarisi("kamera_kapat", cam_seciciler, KONTROL_BEKLEME_MS)
+        if bulunan:
             try:
-                btn = self.page.locator(s).first
-                if await btn.is_visible(timeout=2000):
-                    await btn.click()
-                    print("📷  Kamera kapatıldı.")
-                    break
+                await bulunan[1].click()
+                print("📷  Kamera kapatıldı.")
             except Exception:
-                continue
+                pass
 
     async def _gurultu_giderme_kapat(self):
         """Diğer seçenekler → Ayarlar → Gürültü giderme toggleını kapat."""
@@ -522,30 +784,17 @@ class MeetBot:
             '[aria-label="More options"]', 
             'button i:has-text("more_vert")', # İkon tabanlı (bazen işe yarar)
             'button:has(i.google-material-icons:has-text("more_vert"))',
+            'button:has-text("more_vert")',  # Kaba kuvvet (ikon ismi)
         ]
         
-        menu_acildi = False
-        for s in uc_nokta_seciciler:
-            try:
-                # Timeout'u düşürdük, hızlı denesin
-                btn = self.page.locator(s).first
-                if await btn.is_visible(timeout=1000):
-                    await btn.click()
-                    menu_acildi = True
-                    break
-            except Exception:
-                continue
-        
-        if not menu_acildi:
-            # Fallback: Kaba kuvvet arama (ikon ismi vs)
-            try:
-                await self.page.locator("button").filter(has_text="more_vert").first.click(timeout=1000)
-                menu_acildi = True
-            except:
-                print("⚠️  'Diğer seçenekler' butonu bulunamadı, ayarlar atlanıyor.")
-                return
-
-        await self.page.wait_for_timeout(500)
+        bulunan = await self._secici_yarisi("diger_secenekler", uc_nokta_seciciler, KONTROL_BEKLEME_MS)
+        try:
+            if not bulunan:
+                raise RuntimeError("bulunamadı")
+            await bulunan[1].click()
+        except Exception:
+            print("⚠️  'Diğer seçenekler' butonu bulunamadı, ayarlar atlanıyor.")
+            return
 
         # 2. "Ayarlar"a tıkla
         ayarlar_acildi = False
@@ -554,7 +803,7 @@ class MeetBot:
             settings_item = self.page.get_by_role("menuitem", name="Ayarlar").or_(
                             self.page.get_by_role("menuitem", name="Settings"))
             
-            if await settings_item.is_visible(timeout=2000):
+            if await self._bekle(settings_item, MENU_BEKLEME_MS):
                 await settings_item.click()
                 ayarlar_acildi = True
         except Exception:
@@ -575,20 +824,21 @@ class MeetBot:
                     print("⚠️  'Ayarlar' menüsü bulunamadı.")
                     return
 
-        await self.page.wait_for_timeout(1000)
+        if not await self._bekle('[role="dialog"]', MENU_BEKLEME_MS):
+            print("⚠️  Ayarlar penceresi açılmadı.")
 
         # 3. Gürültü giderme switchini kapat (Robust JS Mantığı)
         print("🔍  Gürültü giderme toggle'ı aranıyor (JS)...")
         try:
             # Önce "Ses/Audio" sekmesine geçildiğinden emin ol
-            await self.page.evaluate('''() => {
+            await self._evaluate('''() => {
                 const tabs = Array.from(document.querySelectorAll('[role="tab"]'));
                 const audioTab = tabs.find(t => t.innerText.includes("Ses") || t.innerText.includes("Audio"));
                 if (audioTab) audioTab.click();
             }''')
-            await self.page.wait_for_timeout(500)
+            await self._bekle('[role="dialog"] [role="switch"], [role="dialog"] [role="checkbox"]', MENU_BEKLEME_MS)
 
-            result = await self.page.evaluate('''() => {
+            result = await self._evaluate('''() => {
                 const toggles = Array.from(document.querySelectorAll('[role="switch"], [role="checkbox"]'));
                 for (const t of toggles) {
                     // Toggle'ın üst elementlerinde "gürültü" veya "noise" ara
@@ -613,8 +863,6 @@ class MeetBot:
 
         # 4. Ayarlar penceresini kapat (KESİN)
         print("✖️  Ayarlar kapatılıyor...")
-        await self.page.wait_for_timeout(500)
-        
         close_strategies = [
             lambda: self.page.get_by_label("Kapat").click(timeout=1000),
             lambda: self.page.get_by_label("Close").click(timeout=1000),
@@ -624,7 +872,8 @@ class MeetBot:
         for strategy in close_strategies:
             try:
                 await strategy()
-                await self.page.wait_for_timeout(300)
+                if await self._bekle('[role="dialog"]', 1000, state="hidden"):
+                    break
             except:
                 continue
         
@@ -644,38 +893,43 @@ class MeetBot:
                 'button:has-text("Hayır")', 'button:has-text("No thanks")',
                 '[data-mdc-dialog-action="close"]'
             ]
-            for selector in popups:
-                try:
-                    element = self.page.locator(selector).first
-                    if await element.is_visible(timeout=500):
-                        await element.click()
-                        print(f"🧹  Pop-up kapatıldı: {selector}")
-                except:
-                    pass
+            # Her turda görünen ilk pop-up kapatılır (üst üste birkaç tane olabilir);
+            # her seçici en fazla bir kez tıklanır
+            while popups:
+                bulunan = await self._secici_yarisi("popup", popups, 500)
+                if not bulunan:
+                    break
+                popups.remove(bulunan[0])
+                await bulunan[1].click()
+                print(f"🧹  Pop-up kapatıldı: {bulunan[0]}")
         except:
             pass
 
     # ── Bot komutları (sunucudan gelir) ─────────────────────
 
-    async def play_audio(self, url: str):
+    async def play_audio(self, url: str, live: bool = False, gain_db: float = 0.0):
         """Belirtilen URL'deki ses dosyasını çal."""
         try:
-            await self.page.evaluate(AUDIO_INJECT_SCRIPT)
-        except Exception:
-            pass
-
-        try:
-            # URL'yi tam URL'ye çevir
-            full_url = f"http://localhost:8000{url}" if url.startswith("/") else url
-            await self.page.evaluate(f'window.__meetbot && window.__meetbot.play("{full_url}")')
+            await self._rpc("play", self._full_url(url), bool(live), float(gain_db))
             print(f"▶️  Çalınıyor: {url}")
         except Exception as e:
             print(f"⚠️  Ses çalma hatası: {e}")
 
+    async def preload_audio(self, url: Optional[str], gain_db: float = 0.0):
+        """Sıradaki parçayı sayfada önceden tamponla (url None → ipucunu kaldır)."""
+        try:
+            await self._rpc("preload", self._full_url(url) if url else None, float(gain_db))
+        except Exception as e:
+            print(f"⚠️  Ön yükleme hatası: {e}")
+
+    def _full_url(self, url: str) -> str:
+        """Sunucu yolunu tarayıcının açacağı tam URL'ye çevir (bu odanın sunucusu)."""
+        return f"http://localhost:{self.http_port}{url}" if url.startswith("/") else url
+
     async def stop_audio(self):
         """Sesi durdur (reset)."""
         try:
-            await self.page.evaluate('window.__meetbot && window.__meetbot.stop()')
+            await self._rpc("stop")
             print("⏹️  Ses durduruldu (Reset).")
         except Exception as e:
             print(f"⚠️  Ses durdurma hatası: {e}")
@@ -683,7 +937,7 @@ class MeetBot:
     async def pause_audio(self):
         """Sesi duraklat."""
         try:
-            await self.page.evaluate('window.__meetbot && window.__meetbot.pause()')
+            await self._rpc("pause")
             print("⏸️  Ses duraklatıldı.")
         except Exception as e:
             print(f"⚠️  Ses duraklatma hatası: {e}")
@@ -691,7 +945,7 @@ class MeetBot:
     async def resume_audio(self):
         """Sesi devam ettir."""
         try:
-            await self.page.evaluate('window.__meetbot && window.__meetbot.resume()')
+            await self._rpc("resume")
             print("▶️  Ses devam ettiriliyor.")
         except Exception as e:
             print(f"⚠️  Ses devam ettirme hatası: {e}")
@@ -699,14 +953,21 @@ class MeetBot:
     async def set_music_volume(self, value: int):
         """Müzik ses seviyesini ayarla (0-100)."""
         try:
-            await self.page.evaluate(f'window.__meetbot && window.__meetbot.setMusicVolume({value})')
+            await self._rpc("setMusicVolume", value)
+        except Exception:
+            pass
+
+    async def set_track_gain(self, gain_db: float):
+        """Çalan parçanın ses yüksekliği kazancını (dB) uygula."""
+        try:
+            await self._rpc("setTrackGain", float(gain_db))
         except Exception:
             pass
 
     async def set_mic_volume(self, value: int):
         """Mikrofon çıkış ses seviyesini ayarla (0-100)."""
         try:
-            await self.page.evaluate(f'window.__meetbot && window.__meetbot.setMicVolume({value})')
+            await self._rpc("setMicVolume", value)
         except Exception:
             pass
 
@@ -718,25 +979,26 @@ class MeetBot:
         try:
             if muted:
                 # Kapatma butonları
-                selector = (
-                    '[aria-label*="ikrofonu kapat"], '
-                    '[aria-label="Turn off microphone"], '
-                    '[data-tooltip*="ikrofonu kapat"]'
-                )
+                adaylar = [
+                    '[aria-label*="ikrofonu kapat"]',
+                    '[aria-label="Turn off microphone"]',
+                    '[data-tooltip*="ikrofonu kapat"]',
+                ]
                 action = "kapatıldı"
+                anahtar = "mikrofon_kapat"
             else:
                 # Açma butonları
-                selector = (
-                    '[aria-label*="ikrofonu aç"], '
-                    '[aria-label="Turn on microphone"], '
-                    '[data-tooltip*="ikrofonu aç"]'
-                )
+                adaylar = [
+                    '[aria-label*="ikrofonu aç"]',
+                    '[aria-label="Turn on microphone"]',
+                    '[data-tooltip*="ikrofonu aç"]',
+                ]
                 action = "açıldı"
+                anahtar = "mikrofon_ac"
 
-            # Bekleme süresini düşürdük (zaten görünürse tıklar)
-            btn = self.page.locator(selector).first
-            if await btn.is_visible(timeout=2000):
-                await btn.click()
+            bulunan = await self._secici_yarisi(anahtar, adaylar, SECICI_BEKLEME_MS)
+            if bulunan:
+                await bulunan[1].click()
                 print(f"✅  Mikrofon {action}.")
             else:
                 print("ℹ️  Mikrofon zaten istenen durumda.")
@@ -744,50 +1006,38 @@ class MeetBot:
         except Exception as e:
             pass  # Hata bastır, akışı bozma
 
-    def _start_song_ended_checker(self):
-        """Şarkı bittiğini ve ilerlemeyi periyodik kontrol et."""
-        if self._song_ended_check_task:
-            self._song_ended_check_task.cancel()
-
-        self._last_progress_update = 0
+    async def _on_page_event(self, source, event: str, payload: dict):
+        """Sayfanın ittiği ses olayı (ended, error, stalled, timeupdate)."""
+        # Sayfanın beklemesine gerek yok: geri çağrılar (sonraki şarkının
+        # indirilmesi gibi) uzun sürebilir
+        asyncio.create_task(self._dispatch_page_event(event, payload or {}))
 
-        async def check_loop():
-            while True:
-                await asyncio.sleep(1)
-                try:
-                    # Hem bitti mi diye bak, hem de süreleri al
-                    data = await self.page.evaluate('''() => {
-                        const ended = window.__meetbot_song_ended;
-                        if (ended) window.__meetbot_song_ended = false;
-                        
-                        let current = 0;
-                        let total = 0;
-                        if (window.__meetbot && window.__meetbot.audio) {
-                            current = window.__meetbot.audio.currentTime || 0;
-                            total = window.__meetbot.audio.duration || 0;
-                        }
-                        
-                        return { ended: !!ended, current, total };
-                    }''')
-                    
-                    # 1. Şarkı bitti mi?
-                    if data["ended"] and self._on_song_ended:
-                        await self._on_song_ended()
-                    
-                    # 2. İlerleme güncellemesi (Sadece oynatılıyorsa ve anlamlı fark varsa)
-                    # Her saniye gönderiyoruz
-                    if self._on_progress and data["total"] > 0:
-                        await self._on_progress(data["current"], data["total"])
-
-                except Exception:
-                    pass
-
-        self._song_ended_check_task = asyncio.create_task(check_loop())
+    async def _dispatch_page_event(self, event: str, payload: dict):
+        try:
+            if event == "ended":
+                if payload.get("failed"):
+                    print(f"⚠️  Sıradaki parça kendiliğinden başlatılamadı, yeniden denenecek: "
+                          f"{payload['failed']} ({payload.get('message')})")
+                if self._on_song_ended:
+                    await self._on_song_ended()
+            elif event == "error":
+                print(f"⚠️  Çalma hatası (sayfa): {payload.get('message')}")
+                if self._on_song_error:
+                    await self._on_song_error(payload.get("message", ""))
+            elif event == "stalled":
+                print("⏳  Ses akışı bekliyor (veri gelmiyor)...")
+            elif event == "timeupdate":
+                if self._on_progress and payload.get("current", 0) > 0:
+                    await self._on_progress(payload["current"], payload.get("total", 0))
+        except Exception as e:
+            print(f"⚠️  Sayfa olayı işlenemedi ({event}): {e}")
 
     async def handle_command(self, command: str, data: dict):
         """Sunucudan gelen komutu işle."""
         if command == "play":
-            await self.play_audio(data["url"])
+            await self.play_audio(data["url"], data.get("live", False), data.get("gain_db", 0.0))
+        elif command == "preload":
+            await self.preload_audio(data.get("url"), data.get("gain_db", 0.0))
         elif command == "stop":
             await self.stop_audio()
         elif command == "pause":
@@ -796,6 +1046,8 @@ class MeetBot:
             await self.resume_audio()
         elif command == "set_music_volume":
             await self.set_music_volume(data["value"])
+        elif command == "set_track_gain":
+            await self.set_track_gain(data["gain_db"])
         elif command == "set_mic_volume":
             await self.set_mic_volume(data["value"])
         elif command == "set_mic_mute":
@@ -843,8 +1095,6 @@ class MeetBot:
 
     async def cleanup(self):
         """Temizlik."""
-        if self._song_ended_check_task:
-            self._song_ended_check_task.cancel()
         if self.browser:
             try:
                 await self.browser.close()
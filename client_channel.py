@@ -0,0 +1,174 @@
+# ──────────────────────────────────────────────────────────────
+#  client_channel.py — WebSocket istemcisi başına giden mesaj kuyruğu
+#  broadcast() hiçbir istemciyi beklemez: mesaj her istemcinin kendi
+#  sınırlı kuyruğuna konur, ayrı bir yazıcı görev sırayla gönderir.
+#  Yerini yenisi alan mesajlar (ilerleme, ses seviyesi...) birleştirilir,
+#  geride kalan istemcinin bağlantısı kesilir.
+#
+#  Kodlama bağlantıda alt protokolle seçilir: "meetbot.msgpack" isteyen
+#  istemciye (msgpack kuruluysa) kısa alan etiketli ikili mesaj, diğerlerine
+#  JSON metni gönderilir. İstemciden gelen komutlar her zaman JSON'dur.
+# ──────────────────────────────────────────────────────────────
+
+import asyncio
+import json
+import os
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple, Union
+
+from fastapi import WebSocket
+
+try:
+    import orjson  # İsteğe bağlı — json'dan birkaç kat hızlı
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack  # İsteğe bağlı — ikili kodlama
+except ImportError:
+    msgpack = None
+
+ENCODING_JSON = "json"
+ENCODING_MSGPACK = "msgpack"
+SUBPROTOCOLS = {"meetbot.json": ENCODING_JSON, "meetbot.msgpack": ENCODING_MSGPACK}
+
+# msgpack mesajlarında uzun alan adları yerine kısa etiketler
+# (static/app.js'deki FIELD_TAGS ile aynı olmalı)
+FIELD_TAGS = {
+    "id": "i",
+    "title": "t",
+    "duration": "d",
+    "duration_str": "ds",
+    "url": "u",
+    "added_by": "b",
+    "added_at": "a",
+    "ready": "r",
+    "before": "bf",
+    "items": "it",
+    "fields": "f",
+}
+
+# Gönderilmeyi bekleyen maksimum mesaj — aşan istemci "yavaş" sayılır
+SEND_QUEUE_LIMIT = int(os.environ.get("MEETBOT_WS_QUEUE_LIMIT", "256"))
+# Tek bir mesajın gönderimi bundan uzun sürerse bağlantı kesilir (saniye)
+SEND_TIMEOUT = float(os.environ.get("MEETBOT_WS_SEND_TIMEOUT", "10"))
+
+# Sadece en güncel hali önemli olan mesaj tipleri
+COALESCED_TYPES = ("playback_anchor", "volume_update", "download_status", "mic_status")
+
+
+def choose_encoding(offered: List[str]) -> Tuple[Optional[str], str]:
+    """İstemcinin önerdiği alt protokollerden birini seç: (alt protokol, kodlama)."""
+    for name in offered:
+        encoding = SUBPROTOCOLS.get(name)
+        if encoding == ENCODING_MSGPACK and msgpack is None:
+            continue
+        if encoding:
+            return name, encoding
+    return None, ENCODING_JSON
+
+
+def _shorten(value):
+    """Sözlük anahtarlarını FIELD_TAGS'e göre kısalt (iç içe)."""
+    if isinstance(value, dict):
+        return {FIELD_TAGS.get(k, k): _shorten(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_shorten(v) for v in value]
+    return value
+
+
+def encode_message(message: dict, encoding: str = ENCODING_JSON) -> Union[str, bytes]:
+    """Mesajı istenen kodlamaya çevir (JSON için orjson varsa onunla)."""
+    if encoding == ENCODING_MSGPACK:
+        return msgpack.packb(_shorten(message), use_bin_type=True)
+    if orjson is not None:
+        # download_status gibi mesajlarda anahtarlar int (şarkı ID'si)
+        return orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    return json.dumps(message, ensure_ascii=False)
+
+
+class ClientChannel:
+    """Tek bir WebSocket bağlantısının giden mesaj kuyruğu ve yazıcı görevi."""
+
+    def __init__(self, ws: WebSocket, limit: int = SEND_QUEUE_LIMIT, encoding: str = ENCODING_JSON):
+        self.ws = ws
+        self.limit = limit
+        self.encoding = encoding
+        self.closed = False
+        # (tip, veri) — birleştirilen mesajlarda veri None'dır, güncel hali _latest'tedir
+        self._pending: Deque[Tuple[Optional[str], Optional[Union[str, bytes]]]] = deque()
+        self._latest: Dict[str, Union[str, bytes]] = {}
+        self._wakeup = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def send(self, message: dict) -> bool:
+        """Mesajı kuyruğa koy (beklemez). Bağlantı kapalıysa False döner."""
+        return self.send_raw(message.get("type", ""), encode_message(message, self.encoding))
+
+    def send_raw(self, msg_type: str, data: Union[str, bytes]) -> bool:
+        """
+        Bu istemcinin kodlamasıyla serileştirilmiş mesajı kuyruğa koy
+        (broadcast her kodlama için tek seferde serileştirir).
+        """
+        if self.closed:
+            return False
+
+        if msg_type in COALESCED_TYPES:
+            # Kuyrukta aynı tipten bekleyen varsa eskisini çıkar; güncel hali
+            # sona eklenir ki arada gönderilen mesajlardan önce gitmesin
+            if msg_type in self._latest:
+                self._pending.remove((msg_type, None))
+            self._latest[msg_type] = data
+            self._pending.append((msg_type, None))
+        else:
+            self._pending.append((msg_type, data))
+
+        if len(self._pending) > self.limit:
+            print(f"🐢  İstemci geride kaldı ({len(self._pending)} bekleyen mesaj), bağlantı kesiliyor")
+            self.close()
+            return False
+
+        self._wakeup.set()
+        return True
+
+    def close(self):
+        """Kuyruğu bırak, yazıcıyı durdur ve soketi kapat."""
+        if self.closed:
+            return
+        self.closed = True
+        self._pending.clear()
+        self._latest.clear()
+        if self._writer and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        asyncio.create_task(self._close_socket())
+
+    async def _close_socket(self):
+        try:
+            await self.ws.close(code=1013)  # "Try again later"
+        except Exception:
+            pass
+
+    async def _write_loop(self):
+        while not self.closed:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            msg_type, data = self._pending.popleft()
+            if data is None:
+                data = self._latest.pop(msg_type)
+
+            try:
+                if isinstance(data, bytes):
+                    await asyncio.wait_for(self.ws.send_bytes(data), SEND_TIMEOUT)
+                else:
+                    await asyncio.wait_for(self.ws.send_text(data), SEND_TIMEOUT)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.close()
+                return
@@ -0,0 +1,218 @@
+# ──────────────────────────────────────────────────────────────
+#  download_scheduler.py — Öncelikli, iptal edilebilir indirme sırası
+#  Çalan şarkı önce, sonra kuyruktaki ilk N şarkı indirilir.
+#  Kuyruktan çıkan / geriye itilen şarkının indirmesi iptal edilir
+#  (yt-dlp işçi süreci öldürülür).
+# ──────────────────────────────────────────────────────────────
+
+import asyncio
+import heapq
+import itertools
+import os
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+DOWNLOAD_WORKERS = int(os.environ.get("MEETBOT_DOWNLOAD_WORKERS", "2"))
+PREFETCH_COUNT = int(os.environ.get("MEETBOT_PREFETCH_COUNT", "2"))
+# Çalınacak şarkının indirmesi için en fazla bekleme (saniye)
+PLAY_WAIT_TIMEOUT = float(os.environ.get("MEETBOT_PLAY_WAIT_TIMEOUT", "120"))
+# Başarısız indirme, çalma sırası gelince (öncelik 0) bu sayıya kadar yeniden denenir
+MAX_ATTEMPTS = 2
+
+# İş durumları
+QUEUED = "queued"
+DOWNLOADING = "downloading"
+READY = "ready"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Başarısızlık nedenleri (DownloadFailed.reason)
+REASON_CANCELLED = "cancelled"   # İndirme iptal edildi (kuyruktan çıktı, atlandı...)
+REASON_ERROR = "error"           # yt-dlp / ağ hatası
+REASON_NO_FILE = "no_file"       # İş bitti ama dosya yok
+REASON_TIMEOUT = "timeout"       # Bekleme süresi doldu (indirme sürüyor olabilir)
+
+
+class DownloadFailed(Exception):
+    """İndirme beklenirken başarısızlık. reason yukarıdaki REASON_* değerlerinden biridir."""
+
+    def __init__(self, reason: str, detail: str = ""):
+        super().__init__(f"{reason}: {detail}" if detail else reason)
+        self.reason = reason
+        self.detail = detail
+
+
+class DownloadJob:
+    def __init__(self, song: dict, priority: int, attempt: int = 1):
+        self.song = song
+        self.priority = priority
+        self.attempt = attempt
+        self.state = QUEUED
+        self.error: Optional[str] = None
+        self.reason: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+        self.done = asyncio.Event()   # İş bittiğinde (başarılı/başarısız/iptal) set edilir
+
+    @property
+    def finished(self) -> bool:
+        return self.done.is_set()
+
+    async def wait(self, timeout: Optional[float] = None) -> str:
+        """
+        İş bitene kadar bekle ve dosya yolunu döndür.
+        Başarısızlıkta DownloadFailed fırlatır. Süre dolması işi iptal etmez.
+        """
+        if not self.done.is_set():
+            try:
+                await asyncio.wait_for(self.done.wait(), timeout)
+            except asyncio.TimeoutError:
+                raise DownloadFailed(REASON_TIMEOUT, f"{int(timeout)} sn içinde bitmedi")
+
+        if self.state == READY:
+            return self.song["file_path"]
+        raise DownloadFailed(self.reason or REASON_ERROR, self.error or "")
+
+
+class DownloadScheduler:
+    """
+    Sınırlı sayıda işçiyle çalışan öncelik kuyruğu (küçük sayı = önce).
+    run_job(song) şarkıyı indirip song["file_path"]'i doldurmalı,
+    başarısız olursa exception fırlatmalıdır (hata iş üzerinde saklanır).
+    """
+
+    def __init__(self, run_job: Callable[[dict], Awaitable[None]],
+                 workers: int = DOWNLOAD_WORKERS,
+                 on_change: Optional[Callable[[], None]] = None):
+        self._run_job = run_job
+        self._worker_count = workers
+        self._on_change = on_change
+        self.jobs: Dict[int, DownloadJob] = {}   # song_id -> job
+        self._heap: List[Tuple[int, int, DownloadJob]] = []
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._workers: List[asyncio.Task] = []
+
+    # ── Dış arayüz ───────────────────────────────────────────
+
+    def submit(self, song: dict, priority: int) -> DownloadJob:
+        """
+        Şarkıyı sıraya koy. Zaten sıradaysa önceliğini güncelle.
+        Başarısız olmuş iş (ör. ön indirmede geçici ağ hatası) çalma isteğiyle
+        (öncelik 0) gelirse eski hata döndürülmez, yeniden denenir.
+        """
+        job = self.jobs.get(song["id"])
+        if job and job.state == FAILED and priority == 0 and job.attempt < MAX_ATTEMPTS:
+            print(f"🔁  İndirme yeniden deneniyor: {song.get('title')} ({job.error or job.reason})")
+            return self._enqueue(song, priority, job.attempt + 1)
+        if job and job.state in (DOWNLOADING, READY, FAILED):
+            return job
+        if job and job.state == QUEUED:
+            if priority != job.priority:
+                job.priority = priority
+                heapq.heappush(self._heap, (priority, next(self._seq), job))
+                self._changed()
+            return job
+
+        return self._enqueue(song, priority)
+
+    def cancel(self, song_id: int):
+        """Şarkının indirmesini iptal et (çalışıyorsa yt-dlp süreci öldürülür)."""
+        job = self.jobs.pop(song_id, None)
+        if not job:
+            return
+        if job.state == QUEUED:
+            self._finish(job, CANCELLED, REASON_CANCELLED)
+        elif job.state == DOWNLOADING and job.task:
+            print(f"✋  İndirme iptal edildi: {job.song.get('title')}")
+            job.task.cancel()
+        self._changed()
+
+    def sync(self, wanted: List[Tuple[dict, int]]):
+        """
+        İstenen (şarkı, öncelik) listesine göre sırayı güncelle.
+        Listede olmayan bekleyen/süren indirmeler iptal edilir.
+        """
+        wanted_ids = {song["id"] for song, _ in wanted}
+        for song_id, job in list(self.jobs.items()):
+            if song_id not in wanted_ids and job.state in (QUEUED, DOWNLOADING):
+                self.cancel(song_id)
+
+        for song, priority in wanted:
+            if not song.get("file_path"):
+                self.submit(song, priority)
+
+    def status(self) -> Dict[int, str]:
+        """Arayüz için {song_id: durum} sözlüğü."""
+        return {song_id: job.state for song_id, job in self.jobs.items()}
+
+    async def shutdown(self):
+        for job in list(self.jobs.values()):
+            if job.task:
+                job.task.cancel()
+            elif job.state == QUEUED:
+                self._finish(job, CANCELLED, REASON_CANCELLED)
+        for worker in self._workers:
+            worker.cancel()
+        self._workers.clear()
+
+    # ── İç işleyiş ──────────────────────────────────────────
+
+    def _enqueue(self, song: dict, priority: int, attempt: int = 1) -> DownloadJob:
+        """Yeni iş oluştur ve sıraya koy (aynı şarkının eski işinin yerine geçer)."""
+        job = DownloadJob(song, priority, attempt)
+        self.jobs[song["id"]] = job
+        song["_downloading"] = True
+        heapq.heappush(self._heap, (priority, next(self._seq), job))
+        self._ensure_workers()
+        self._wakeup.set()
+        self._changed()
+        return job
+
+    def _changed(self):
+        if self._on_change:
+            self._on_change()
+
+    def _finish(self, job: DownloadJob, state: str, reason: Optional[str] = None,
+                error: Optional[str] = None):
+        job.state = state
+        job.reason = reason
+        job.error = error
+        job.song["_downloading"] = False
+        job.done.set()
+
+    def _ensure_workers(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._workers = [w for w in self._workers if not w.done()]
+        while len(self._workers) < self._worker_count:
+            self._workers.append(asyncio.create_task(self._worker_loop()))
+
+    def _next_job(self) -> Optional[DownloadJob]:
+        while self._heap:
+            priority, _, job = heapq.heappop(self._heap)
+            # Eski (önceliği değişmiş veya iptal edilmiş) kayıtları atla
+            if job.state == QUEUED and job.priority == priority:
+                return job
+        return None
+
+    async def _worker_loop(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            job.state = DOWNLOADING
+            self._changed()
+            job.task = asyncio.create_task(self._run_job(job.song))
+            await asyncio.wait([job.task])
+
+            if job.task.cancelled():
+                self._finish(job, CANCELLED, REASON_CANCELLED)
+            elif job.task.exception() is not None:
+                self._finish(job, FAILED, REASON_ERROR, str(job.task.exception()))
+            elif job.song.get("file_path"):
+                self._finish(job, READY)
+            else:
+                self._finish(job, FAILED, REASON_NO_FILE)
+            self._changed()
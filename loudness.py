@@ -0,0 +1,149 @@
+# ──────────────────────────────────────────────────────────────
+#  loudness.py — Parça başına ses yüksekliği analizi (EBU R128)
+#  Analiz indirme sonrası bir kez ffmpeg ile yapılır, sonuç dosyanın
+#  yanında `<key>.loudness.json` olarak saklanır. Çalma sırasında sadece
+#  hazır kazanç (dB) sayfaya gönderilir, gerçek zamanlı DSP yapılmaz.
+# ──────────────────────────────────────────────────────────────
+
+import asyncio
+import json
+import os
+import re
+from typing import Dict, Optional
+
+LOUDNESS_SUFFIX = ".loudness.json"
+
+# Hedef seviye (LUFS) — MEETBOT_LOUDNESS_TARGET ile değiştirilebilir
+TARGET_LUFS = float(os.environ.get("MEETBOT_LOUDNESS_TARGET", "-14"))
+MAX_TRUE_PEAK = -1.0     # dBTP — kazanç sonrası tepe bu değeri geçmesin
+MAX_GAIN_DB = 12.0       # Kazanç sınırı (± dB)
+ANALYSIS_TIMEOUT = 120   # saniye
+
+_I_RE = re.compile(r"I:\s+(-?\d+(?:\.\d+)?) LUFS")
+_PEAK_RE = re.compile(r"Peak:\s+(-?\d+(?:\.\d+)?|-inf) dBFS")
+
+_results: Dict[str, dict] = {}            # key -> analiz sonucu (RAM)
+_running: Dict[str, asyncio.Task] = {}    # key -> süren analiz
+_semaphore: Optional[asyncio.Semaphore] = None  # Aynı anda tek ffmpeg
+_ffmpeg_missing = False
+
+
+def sidecar_path(audio_path: str, key: str) -> str:
+    return os.path.join(os.path.dirname(audio_path), f"{key}{LOUDNESS_SUFFIX}")
+
+
+def load_loudness(audio_path: str, key: str) -> Optional[dict]:
+    """Analiz sonucunu RAM'den veya yan dosyadan oku (yoksa None)."""
+    if key in _results:
+        return _results[key]
+    try:
+        with open(sidecar_path(audio_path, key), "r", encoding="utf-8") as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        return None
+    _results[key] = result
+    return result
+
+
+def gain_db(loudness: Optional[dict]) -> float:
+    """Hedef seviyeye ulaşmak için gereken kazanç (tepe ve ± sınırlarla)."""
+    if not loudness or loudness.get("integrated_lufs") is None:
+        return 0.0
+
+    gain = TARGET_LUFS - loudness["integrated_lufs"]
+    peak = loudness.get("true_peak_dbfs")
+    if peak is not None:
+        gain = min(gain, MAX_TRUE_PEAK - peak)
+    return round(max(-MAX_GAIN_DB, min(MAX_GAIN_DB, gain)), 2)
+
+
+async def ensure_loudness(audio_path: str, key: str) -> Optional[dict]:
+    """Analiz yoksa ffmpeg ile yap ve yan dosyaya yaz. Aynı parça için tek analiz çalışır."""
+    existing = load_loudness(audio_path, key)
+    if existing is not None:
+        return existing
+    if _ffmpeg_missing:
+        return None
+
+    task = _running.get(key)
+    if task is None:
+        task = asyncio.create_task(_analyze(audio_path, key))
+        _running[key] = task
+        task.add_done_callback(lambda _t: _running.pop(key, None))
+    return await asyncio.shield(task)
+
+
+async def _read_summary(proc) -> str:
+    """
+    ffmpeg çıktısını satır satır oku, sadece sondaki "Summary:" bloğunu tut
+    (kare başına ölçüm satırları biriktirilmeden atılır).
+    """
+    summary = []
+    in_summary = False
+    async for raw in proc.stderr:
+        line = raw.decode("utf-8", errors="replace")
+        if "Summary:" in line:
+            in_summary = True
+            summary.clear()
+        elif in_summary:
+            summary.append(line)
+    await proc.wait()
+    return "".join(summary)
+
+
+async def _analyze(audio_path: str, key: str) -> Optional[dict]:
+    global _semaphore, _ffmpeg_missing
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(1)
+
+    async with _semaphore:
+        cmd = [
+            "ffmpeg", "-hide_banner", "-nostats",
+            "-i", audio_path,
+            "-af", "ebur128=peak=true",
+            "-f", "null", "-",
+        ]
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except FileNotFoundError:
+            _ffmpeg_missing = True
+            print("⚠️  ffmpeg bulunamadı, ses yüksekliği analizi devre dışı.")
+            return None
+
+        try:
+            summary = await asyncio.wait_for(_read_summary(proc), ANALYSIS_TIMEOUT)
+        except asyncio.TimeoutError:
+            proc.kill()
+            print(f"⚠️  Ses yüksekliği analizi zaman aşımı: {os.path.basename(audio_path)}")
+            return None
+        except asyncio.CancelledError:
+            proc.kill()
+            raise
+
+    integrated = _I_RE.search(summary)
+    peak = _PEAK_RE.search(summary)
+    if proc.returncode != 0 or not integrated:
+        print(f"⚠️  Ses yüksekliği analizi başarısız: {os.path.basename(audio_path)}")
+        return None
+
+    peak = peak.group(1) if peak else None
+    result = {
+        "integrated_lufs": float(integrated.group(1)),
+        "true_peak_dbfs": None if peak in (None, "-inf") else float(peak),
+    }
+
+    try:
+        with open(sidecar_path(audio_path, key), "w", encoding="utf-8") as f:
+            json.dump(result, f)
+    except OSError as e:
+        print(f"⚠️  Ses yüksekliği dosyası yazılamadı: {e}")
+
+    _results[key] = result
+    print(f"🔊  Ses yüksekliği: {result['integrated_lufs']} LUFS, "
+          f"kazanç {gain_db(result):+.1f} dB ({os.path.basename(audio_path)})")
+    return result
+
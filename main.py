@@ -7,20 +7,39 @@ import asyncio
 import os
 import sys
 import threading
-import uvicorn
 
-from server import app, set_bot_callback, on_song_ended, set_cleanup_callback, update_playback_progress
-from bot import MeetBot
+from rooms import configured_rooms, current_room, run_rooms, ROOM_ENV
+import metrics
+
+# Not: server, bot ve uvicorn main() içinde import edilir. yt-dlp işçileri
+# "spawn" ile açıldığında bu modülü __mp_main__ olarak yeniden yükler;
+# modül seviyesinde sunucu/bot kurulumu her işçide tekrar çalışırdı.
 
 
 # ──────────────────────────────────────────────────────────────
 #  Global bot referansı
 # ──────────────────────────────────────────────────────────────
 
-bot = MeetBot()
+bot = None        # MeetBot — main() içinde oluşturulur
 bot_ready = False
 
 
+def _create_bot(room):
+    """Odanın portları ve profiliyle botu oluştur, bellek ölçümünü bağla."""
+    from bot import MeetBot
+
+    meet_bot = MeetBot(
+        cdp_port=room.cdp_port,
+        profile_dir=room.profile_dir,
+        kill_stray_chrome=len(configured_rooms()) == 1,
+        http_port=room.http_port,
+    )
+    metrics.chrome_rss_bytes.set_function(
+        lambda: metrics.process_tree_rss(meet_bot.chrome_process.pid if meet_bot.chrome_process else None)
+    )
+    return meet_bot
+
+
 async def bot_command_handler(command: str, data: dict):
     """
     Sunucudan bota gelen komutları yönlendirir.
@@ -43,6 +62,7 @@ async def bot_command_handler(command: str, data: dict):
 async def _join_meet_task(link: str):
     """Meet'e katılma görevini arka planda çalıştır."""
     global bot_ready
+    from server import on_song_ended, on_song_error, update_playback_progress
     try:
         # Chrome'u başlat ve bağlan
         if not bot.browser:
@@ -51,6 +71,7 @@ async def _join_meet_task(link: str):
 
         # Şarkı bitti callback'i ayarla
         bot._on_song_ended = on_song_ended
+        bot._on_song_error = on_song_error
         bot._on_progress = update_playback_progress
 
         # Meet'e katıl
@@ -73,12 +94,29 @@ async def _join_meet_task(link: str):
 # ──────────────────────────────────────────────────────────────
 
 def main():
+    global bot
+    rooms = configured_rooms()
+    if len(rooms) > 1 and not os.environ.get(ROOM_ENV):
+        # Birden çok oda: her biri kendi sürecinde (bu süreç sadece izler)
+        print("=" * 55)
+        print(f"  🎵  MeetBot — {len(rooms)} oda başlatılıyor")
+        print("=" * 55)
+        run_rooms(rooms, os.path.abspath(__file__))
+        return
+
+    import uvicorn
+    from server import app, set_bot_callback, set_cleanup_callback
+
+    room = current_room()
+    bot = _create_bot(room)
+
+    room_label = "" if room.is_default else f" — Oda: {room.name}"
     print("=" * 55)
-    print("  🎵  MeetBot — Grup Müzik Botu v4.0")
+    print(f"  🎵  MeetBot — Grup Müzik Botu v4.0{room_label}")
     print("=" * 55)
     print()
     print("  📡  Sunucu başlatılıyor...")
-    print("  🌐  Arayüz: http://localhost:8000")
+    print(f"  🌐  Arayüz: http://localhost:{room.http_port}")
     print("  📋  Meet linkini web arayüzünden girin.")
     print()
     print("=" * 55)
@@ -95,8 +133,9 @@ def main():
     config = uvicorn.Config(
         app,
         host="0.0.0.0",
-        port=8000,
+        port=room.http_port,
         log_level="warning",
+        ws_per_message_deflate=True,  # JSON istemcileri için sıkıştırma (tarayıcıyla anlaşılır)
     )
     server = uvicorn.Server(config)
 
@@ -0,0 +1,202 @@
+# ──────────────────────────────────────────────────────────────
+#  metadata_cache.py — URL normalizasyonu + şarkı bilgisi önbelleği
+#  Disk kaydı gecikmeli (DebouncedWriter) ve thread'de yazılır; odalar aynı
+#  dosyayı paylaşabildiği için yazmadan önce diskteki kayıtlarla birleştirilir.
+# ──────────────────────────────────────────────────────────────
+
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import urlparse, parse_qs
+
+from audio_cache import FileLock, LOCKS_DIRNAME
+from state_store import DebouncedWriter
+
+# Metadata geçerlilik süresi (saat) — MEETBOT_METADATA_TTL_HOURS ile değiştirilebilir
+METADATA_TTL = float(os.environ.get("MEETBOT_METADATA_TTL_HOURS", "168")) * 3600
+DISK_LIMIT = 5000      # Diskte tutulacak maksimum kayıt
+SAVE_DEBOUNCE = 2.0    # saniye — art arda eklenen kayıtlar (ör. oynatma listesi) tek yazıma indirgenir
+
+# yt-dlp bilgi dict'i (format listesi, imzalı linkler) — sadece RAM'de, kısa ömürlü
+INFO_TTL = 2 * 3600    # YouTube format linkleri ~6 saatte geçersizleşir
+INFO_LIMIT = 64
+
+_VIDEO_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")
+_YOUTUBE_HOSTS = ("youtube.com", "www.youtube.com", "m.youtube.com", "music.youtube.com",
+                  "youtube-nocookie.com", "www.youtube-nocookie.com")
+
+
+def extract_video_id(url: str) -> Optional[str]:
+    """
+    Farklı YouTube link biçimlerinden 11 karakterlik video ID'sini çıkarır.
+    youtu.be/X, watch?v=X&t=30, music.youtube.com/watch?v=X, /shorts/X, /embed/X ...
+    Tanınmayan linklerde None döner.
+    """
+    try:
+        parsed = urlparse(url.strip())
+    except ValueError:
+        return None
+
+    host = (parsed.hostname or "").lower()
+    parts = [p for p in parsed.path.split("/") if p]
+    candidate = None
+
+    if host in ("youtu.be", "www.youtu.be"):
+        candidate = parts[0] if parts else None
+    elif host in _YOUTUBE_HOSTS:
+        if parsed.path == "/watch":
+            candidate = parse_qs(parsed.query).get("v", [None])[0]
+        elif len(parts) >= 2 and parts[0] in ("shorts", "embed", "live", "v"):
+            candidate = parts[1]
+
+    if candidate and _VIDEO_ID_RE.match(candidate):
+        return candidate
+    return None
+
+
+def extract_playlist_id(url: str) -> Optional[str]:
+    """
+    Oynatma listesi linkinden liste ID'sini çıkarır.
+    Sadece /playlist?list=... veya video içermeyen list= linkleri liste sayılır;
+    watch?v=X&list=Y tek şarkı olarak eklenmeye devam eder.
+    """
+    try:
+        parsed = urlparse(url.strip())
+    except ValueError:
+        return None
+
+    host = (parsed.hostname or "").lower()
+    if host not in _YOUTUBE_HOSTS:
+        return None
+
+    query = parse_qs(parsed.query)
+    list_id = query.get("list", [None])[0]
+    if not list_id:
+        return None
+    if parsed.path == "/playlist" or "v" not in query:
+        return list_id
+    return None
+
+
+def canonical_url(url: str) -> str:
+    """YouTube linklerini tek bir biçime indirger, diğerlerini olduğu gibi bırakır."""
+    video_id = extract_video_id(url)
+    if video_id:
+        return f"https://www.youtube.com/watch?v={video_id}"
+    return url.strip()
+
+
+def canonical_playlist_url(url: str) -> str:
+    """
+    Liste linklerini /playlist?list=... biçimine indirger. yt-dlp watch?list=
+    ve music.youtube.com linklerine girdi yerine yönlendirme (_type: url) döner.
+    """
+    list_id = extract_playlist_id(url)
+    if list_id:
+        return f"https://www.youtube.com/playlist?list={list_id}"
+    return url.strip()
+
+
+def cache_key(url: str) -> str:
+    """Önbellek anahtarı: YouTube için video ID, diğerleri için URL hash'i."""
+    video_id = extract_video_id(url)
+    if video_id:
+        return video_id
+    return hashlib.md5(url.strip().encode()).hexdigest()[:10]
+
+
+class MetadataCache:
+    """
+    Video anahtarına göre şarkı bilgisi önbelleği.
+    Kayıtlar RAM'de tutulur, diskte TTL'li bir JSON dosyasına yazılır.
+    """
+
+    def __init__(self, path: str, ttl: float = METADATA_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.records: dict = self._read()   # key -> {"data", "stored_at"}
+        self.infos: "OrderedDict[str, dict]" = OrderedDict()   # key -> {"info", "stored_at"}
+        self._file_lock = FileLock(os.path.join(os.path.dirname(path), LOCKS_DIRNAME, "metadata.lock"))
+        self._writer = DebouncedWriter(self._snapshot, self._write, SAVE_DEBOUNCE)
+
+    def _read(self) -> dict:
+        """Diskteki süresi dolmamış kayıtlar."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+        now = time.time()
+        return {k: v for k, v in stored.items() if now - v.get("stored_at", 0) < self.ttl}
+
+    async def flush(self):
+        """Bekleyen kayıtları hemen yaz (kapanışta)."""
+        await self._writer.flush()
+
+    def _snapshot(self) -> dict:
+        if len(self.records) > DISK_LIMIT:
+            newest = sorted(self.records.items(), key=lambda kv: kv[1]["stored_at"], reverse=True)
+            self.records = dict(newest[:DISK_LIMIT])
+        return dict(self.records)
+
+    def _write(self, snapshot: dict):
+        """Diğer odaların kayıtlarıyla birleştirip yaz (thread'de, dosya kilidi altında)."""
+        with self._file_lock:
+            merged = self._read()
+            for key, record in snapshot.items():
+                old = merged.get(key)
+                if old is None or old.get("stored_at", 0) <= record["stored_at"]:
+                    merged[key] = record
+            if len(merged) > DISK_LIMIT:
+                newest = sorted(merged.items(), key=lambda kv: kv[1]["stored_at"], reverse=True)
+                merged = dict(newest[:DISK_LIMIT])
+
+            # Süreç başına geçici dosya: odalar aynı dosyayı paylaşabilir
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(merged, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"⚠️  Metadata önbelleği yazılamadı: {e}")
+
+    def get(self, key: str) -> Optional[dict]:
+        """Süresi dolmamış kayıt varsa kopyasını döndür."""
+        record = self.records.get(key)
+        if record is None:
+            return None
+        if time.time() - record["stored_at"] >= self.ttl:
+            del self.records[key]
+            return None
+        return dict(record["data"])
+
+    def put(self, key: str, data: dict):
+        self.records[key] = {"data": dict(data), "stored_at": time.time()}
+        self._writer.schedule()
+
+    # ── yt-dlp bilgi dict'i (tek çözümleme için) ─────────────
+
+    def get_info(self, key: str) -> Optional[dict]:
+        """Metadata adımında çözümlenen bilgi dict'ini döndür (indirme adımı için)."""
+        record = self.infos.get(key)
+        if record is None:
+            return None
+        if time.time() - record["stored_at"] >= INFO_TTL:
+            del self.infos[key]
+            return None
+        self.infos.move_to_end(key)
+        return record["info"]
+
+    def put_info(self, key: str, info: dict):
+        self.infos[key] = {"info": info, "stored_at": time.time()}
+        self.infos.move_to_end(key)
+        while len(self.infos) > INFO_LIMIT:
+            self.infos.popitem(last=False)
+
+    def drop_info(self, key: str):
+        self.infos.pop(key, None)
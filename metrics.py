@@ -0,0 +1,193 @@
+# ──────────────────────────────────────────────────────────────
+#  metrics.py — /metrics için Prometheus metin formatında ölçümler
+#  Bağımlılık yok: histogramlar süreç içinde tutulur, göstergeler
+#  (gauge) her okumada verilen fonksiyonla hesaplanır.
+# ──────────────────────────────────────────────────────────────
+
+import os
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Sequence
+
+try:
+    import psutil  # İsteğe bağlı — yoksa Linux'ta /proc okunur
+except ImportError:
+    psutil = None
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Saniye cinsinden süre kovaları: milisaniyelik WebSocket işlerinden
+# dakikalık indirmelere kadar
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60, 120)
+BYTES_BUCKETS = (256 * 1024, 1024 ** 2, 2 * 1024 ** 2, 5 * 1024 ** 2, 10 * 1024 ** 2,
+                 25 * 1024 ** 2, 50 * 1024 ** 2, 100 * 1024 ** 2)
+
+_registry: List["_Metric"] = []
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        _registry.append(self)
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """Ölçümün Prometheus örnek satırları (HELP/TYPE hariç)."""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Histogram(_Metric):
+    """Kümülatif kovalı histogram (observe() event loop'tan çağrılır)."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)   # son kova: +Inf
+        self._sum = 0.0
+        self._count = 0
+
+    def observe(self, value: float):
+        self._counts[bisect_left(self.buckets, value)] += 1
+        self._sum += value
+        self._count += 1
+
+    @contextmanager
+    def time(self):
+        """with bloğunun süresini (başarılı ya da değil) kaydet."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self._counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{_format_value(bound)}"}} {cumulative}')
+        lines.append(f"{self.name}_sum {_format_value(self._sum)}")
+        lines.append(f"{self.name}_count {self._count}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Değeri okuma anında fonksiyonla hesaplanan gösterge (None → yazılmaz)."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, read: Optional[Callable[[], Optional[float]]] = None):
+        super().__init__(name, help_text)
+        self._read = read
+
+    def set_function(self, read: Callable[[], Optional[float]]):
+        self._read = read
+
+    def samples(self) -> List[str]:
+        if self._read is None:
+            return []
+        try:
+            value = self._read()
+        except Exception:
+            return []
+        return [] if value is None else [f"{self.name} {_format_value(value)}"]
+
+
+def render() -> str:
+    """Tüm ölçümleri Prometheus metin formatında döndür."""
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+
+# ── Süreç belleği ─────────────────────────────────────────────
+
+def _proc_children(pid: int) -> List[int]:
+    children = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                children.extend(int(c) for c in f.read().split())
+    except OSError:
+        pass
+    return children
+
+
+def _proc_rss(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return 0
+
+
+def process_tree_rss(pid: Optional[int]) -> Optional[int]:
+    """
+    Sürecin ve tüm alt süreçlerinin toplam RSS'i (bayt).
+    Chrome her sekme/GPU için ayrı süreç açtığı için ağacın tamamı sayılır.
+    """
+    if not pid:
+        return None
+    if psutil is not None:
+        try:
+            root = psutil.Process(pid)
+            procs = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return None
+        total = 0
+        for proc in procs:
+            try:
+                total += proc.memory_info().rss
+            except psutil.Error:
+                continue
+        return total
+
+    if not os.path.exists(f"/proc/{pid}"):
+        return None  # psutil yok ve /proc yok (Windows/macOS)
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        total += _proc_rss(current)
+        stack.extend(_proc_children(current))
+    return total
+
+
+# ── Ölçümler ──────────────────────────────────────────────────
+
+metadata_seconds = Histogram(
+    "meetbot_metadata_seconds", "get_metadata süresi (önbellekte olmayan şarkılar)")
+download_seconds = Histogram(
+    "meetbot_download_seconds", "download_audio ile yapılan indirmenin süresi")
+download_bytes = Histogram(
+    "meetbot_download_bytes", "İndirilen ses dosyasının boyutu", BYTES_BUCKETS)
+time_to_first_audio_seconds = Histogram(
+    "meetbot_time_to_first_audio_seconds", "Şarkı sırası geldikten bota çal komutu gidene kadar geçen süre")
+broadcast_seconds = Histogram(
+    "meetbot_broadcast_seconds", "broadcast() süresi (serileştirme + kuyruklara koyma)")
+page_evaluate_seconds = Histogram(
+    "meetbot_page_evaluate_seconds", "Bot sayfasında page.evaluate gidiş-dönüş süresi (play hariç)")
+page_play_seconds = Histogram(
+    "meetbot_page_play_seconds", "Sayfada play komutunun süresi (parçanın tamponlanması dahil)")
+
+queue_depth = Gauge("meetbot_queue_depth", "Kuyruktaki şarkı sayısı")
+connected_clients = Gauge("meetbot_connected_clients", "Bağlı WebSocket istemcisi sayısı")
+inflight_downloads = Gauge("meetbot_inflight_downloads", "Süren indirme sayısı")
+chrome_rss_bytes = Gauge("meetbot_chrome_rss_bytes", "Bot Chrome'unun toplam bellek kullanımı (RSS)")
@@ -0,0 +1,74 @@
+# ──────────────────────────────────────────────────────────────
+#  queue_patch.py — Kuyruk değişiklikleri için fark (patch) işlemleri
+#  Her değişiklikte tüm kuyruk yerine sadece değişen kısım yayınlanır:
+#    {"op": "insert", "before": id|None, "items": [...]}
+#    {"op": "remove", "id": id}
+#    {"op": "move",   "id": id, "before": id|None}
+#    {"op": "update", "id": id, "fields": {...}}
+#  ("before": None → listenin sonu)
+# ──────────────────────────────────────────────────────────────
+
+from bisect import bisect_left
+from typing import List, Optional
+
+
+def public_song(song: Optional[dict]) -> Optional[dict]:
+    """İstemcilere gidecek şarkı alanları (iç alanlar ve dosya yolu hariç)."""
+    if song is None:
+        return None
+    public = {k: v for k, v in song.items() if not k.startswith("_") and k != "file_path"}
+    public["ready"] = bool(song.get("file_path"))
+    return public
+
+
+def insert_op(songs: List[dict], before: Optional[int] = None) -> dict:
+    return {"op": "insert", "before": before, "items": [public_song(s) for s in songs]}
+
+
+def remove_op(song_id: int) -> dict:
+    return {"op": "remove", "id": song_id}
+
+
+def update_op(song_id: int, fields: dict) -> dict:
+    return {"op": "update", "id": song_id, "fields": fields}
+
+
+def _longest_increasing_subsequence(values: List[int]) -> List[int]:
+    """En uzun artan alt dizinin indekslerini döndürür (O(n log n))."""
+    tails: List[int] = []       # tails[k] = uzunluğu k+1 olan dizinin son değeri
+    tail_idx: List[int] = []    # ilgili değerin values içindeki indeksi
+    parent = [-1] * len(values)
+
+    for i, v in enumerate(values):
+        k = bisect_left(tails, v)
+        if k == len(tails):
+            tails.append(v)
+            tail_idx.append(i)
+        else:
+            tails[k] = v
+            tail_idx[k] = i
+        parent[i] = tail_idx[k - 1] if k > 0 else -1
+
+    result = []
+    i = tail_idx[-1] if tail_idx else -1
+    while i != -1:
+        result.append(i)
+        i = parent[i]
+    return result[::-1]
+
+
+def reorder_ops(old_ids: List[int], new_ids: List[int]) -> List[dict]:
+    """
+    old_ids sırasını new_ids sırasına getiren en az sayıda "move" işlemi.
+    Yerinde kalabilecek en uzun alt dizi (LIS) sabit tutulur; tek bir
+    sürükle-bırak tek bir move üretir.
+    """
+    position = {song_id: i for i, song_id in enumerate(old_ids)}
+    keep = {new_ids[i] for i in _longest_increasing_subsequence([position[s] for s in new_ids])}
+
+    ops = []
+    for i in range(len(new_ids) - 1, -1, -1):
+        if new_ids[i] not in keep:
+            before = new_ids[i + 1] if i + 1 < len(new_ids) else None
+            ops.append({"op": "move", "id": new_ids[i], "before": before})
+    return ops
@@ -0,0 +1,114 @@
+# ──────────────────────────────────────────────────────────────
+#  rooms.py — Tek kurulumdan birden çok toplantı (oda)
+#  Her oda ayrı bir işçi süreçte çalışır: kendi durumu, kuyruğu,
+#  WebSocket kanalı (ayrı HTTP portu), Chrome profili ve CDP portu olur.
+#  İndirme önbelleği (downloads/) tüm odalar arasında ortaktır.
+#
+#  MEETBOT_ROOMS="ofis,ders"  → iki oda: 8000 ve 8001 portlarında
+#  Tek oda (varsayılan) eskisi gibi 8000 / 9222 / chrome_profil kullanır.
+# ──────────────────────────────────────────────────────────────
+
+import os
+import re
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+DEFAULT_ROOM = "default"
+ROOM_ENV = "MEETBOT_ROOM"             # İşçi sürece hangi odayı çalıştıracağını söyler
+BASE_HTTP_PORT = int(os.environ.get("MEETBOT_BASE_PORT", "8000"))
+BASE_CDP_PORT = int(os.environ.get("MEETBOT_BASE_CDP_PORT", "9222"))
+RESTART_DELAY = 5   # saniye — çöken oda süreci bu kadar sonra yeniden başlatılır
+
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+_NAME_RE = re.compile(r"^[a-z0-9_-]{1,32}$")
+
+
+class Room:
+    """Bir odanın portları ve dosya yolları (sıra numarasından türetilir)."""
+
+    def __init__(self, name: str, index: int):
+        self.name = name
+        self.index = index
+        self.http_port = BASE_HTTP_PORT + index
+        self.cdp_port = BASE_CDP_PORT + index
+
+    @property
+    def is_default(self) -> bool:
+        return self.name == DEFAULT_ROOM
+
+    @property
+    def profile_dir(self) -> str:
+        # Varsayılan oda eski profili kullanır (Google oturumu korunur)
+        suffix = "" if self.is_default else f"_{self.name}"
+        return os.path.join(_BASE_DIR, f"chrome_profil{suffix}")
+
+    @property
+    def state_file(self) -> str:
+        return "state.json" if self.is_default else f"state-{self.name}.json"
+
+    def __repr__(self) -> str:
+        return f"Room({self.name!r}, http={self.http_port}, cdp={self.cdp_port})"
+
+
+def configured_rooms() -> List[Room]:
+    """MEETBOT_ROOMS listesindeki odalar (boşsa tek varsayılan oda)."""
+    names = []
+    for raw in os.environ.get("MEETBOT_ROOMS", "").split(","):
+        name = raw.strip().lower()
+        if not name or name in names:
+            continue
+        if not _NAME_RE.match(name):
+            raise ValueError(f"Geçersiz oda adı: {raw!r} (a-z, 0-9, _ ve - kullanılabilir)")
+        names.append(name)
+    if not names:
+        names = [DEFAULT_ROOM]
+    return [Room(name, i) for i, name in enumerate(names)]
+
+
+def current_room() -> Room:
+    """Bu sürecin çalıştırdığı oda (işçi değilse listedeki ilk oda)."""
+    rooms = configured_rooms()
+    name = os.environ.get(ROOM_ENV)
+    for room in rooms:
+        if room.name == name:
+            return room
+    return rooms[0]
+
+
+def run_rooms(rooms: List[Room], script: str):
+    """
+    Her oda için script'i ayrı bir süreçte başlat ve izle.
+    Beklenmedik şekilde kapanan oda süreci yeniden başlatılır.
+    """
+    procs: Dict[str, subprocess.Popen] = {}
+
+    def spawn(room: Room):
+        env = dict(os.environ, **{ROOM_ENV: room.name})
+        procs[room.name] = subprocess.Popen([sys.executable, script], env=env)
+        print(f"  🚪  Oda '{room.name}': http://localhost:{room.http_port} (CDP {room.cdp_port})")
+
+    for room in rooms:
+        spawn(room)
+
+    try:
+        while True:
+            time.sleep(1)
+            for room in rooms:
+                code = procs[room.name].poll()
+                if code is not None:
+                    print(f"⚠️  Oda '{room.name}' kapandı (kod {code}), {RESTART_DELAY} sn sonra yeniden başlatılıyor...")
+                    time.sleep(RESTART_DELAY)
+                    spawn(room)
+    except KeyboardInterrupt:
+        print("\n\n👋  Odalar kapatılıyor...")
+    finally:
+        for proc in procs.values():
+            if proc.poll() is None:
+                proc.terminate()
+        for proc in procs.values():
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
@@ -9,11 +9,29 @@ import time
 from datetime import datetime
 from typing import Dict, List, Optional
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-
-from audio_manager import get_metadata, download_audio
+from fastapi.responses import FileResponse, StreamingResponse, Response
+
+from audio_cache import AUDIO_EXTENSIONS
+from audio_manager import (
+    get_metadata, download_audio, audio_cache, metadata_cache, is_playlist_url, iter_playlist,
+    track_gain_db, analyze_track,
+    PROGRESSIVE_PLAYBACK, STREAM_MIN_BYTES, STREAM_MEDIA_TYPES,
+    find_stream_file, buffered_bytes, tail_download,
+)
+from metadata_cache import cache_key
+from download_scheduler import (
+    DownloadScheduler, DownloadFailed, PREFETCH_COUNT, PLAY_WAIT_TIMEOUT, REASON_CANCELLED,
+    REASON_TIMEOUT,
+)
+from queue_patch import public_song, insert_op, remove_op, update_op, reorder_ops
+from ytdlp_pool import ytdlp_pool
+from client_channel import ClientChannel, encode_message, choose_encoding
+from song_queue import SongQueue
+from state_store import StateStore
+from rooms import current_room
+import metrics
 
 from contextlib import asynccontextmanager
 
@@ -33,25 +51,45 @@ def set_cleanup_callback(cb):
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup işlemleri (varsa)
-    print("🧹  Başlangıç temizliği yapılıyor (Downloads klasörü)...")
+    # Startup: Önbellek index'ini yükle (Dosyalar yeniden başlatmada korunur)
+    print("📦  Ses önbelleği yükleniyor (Downloads klasörü)...")
     try:
-        if os.path.exists(DOWNLOADS_DIR):
-            for filename in os.listdir(DOWNLOADS_DIR):
-                file_path = os.path.join(DOWNLOADS_DIR, filename)
-                if os.path.isfile(file_path):
-                    os.remove(file_path)
+        audio_cache.set_in_use_provider(_files_in_use)
+        await asyncio.to_thread(audio_cache.load)
+        print(f"✅  Önbellek hazır: {len(audio_cache.entries)} dosya, "
+              f"{audio_cache.total_bytes // (1024 * 1024)} MB / {audio_cache.max_bytes // (1024 * 1024)} MB")
     except Exception as e:
-        print(f"⚠️  Başlangıç temizliği hatası: {e}")
-        
+        print(f"⚠️  Önbellek yükleme hatası: {e}")
+
+    # Önceki oturumun kuyruğunu ve ayarlarını geri yükle
+    try:
+        restore_state()
+    except Exception as e:
+        print(f"⚠️  Kayıtlı durum geri yüklenemedi: {e}")
+    _publish_cache_usage()
+
+    # yt-dlp işçilerini arka planda ısıt (ilk şarkıda import beklenmesin)
+    asyncio.create_task(ytdlp_pool.start())
+
+    # Önceki oturumdaki Meet'e yeniden katıl
+    if app_state["meet_link"] and bot_callback:
+        print(f"🔗  Önceki Meet'e yeniden katılınıyor: {app_state['meet_link']}")
+        app_state["bot_status"] = "connecting"
+        asyncio.create_task(bot_callback("join_meet", {"link": app_state["meet_link"]}))
+
     yield
     # Shutdown işlemleri
+    await state_store.flush(close=True)
+    await audio_cache.flush()
+    await metadata_cache.flush()
     if cleanup_callback:
         print("🛑  Sunucu kapanıyor (Lifespan)...")
         await cleanup_callback()
+    await download_scheduler.shutdown()
+    await ytdlp_pool.shutdown()
 
 app_state = {
-    "queue": [],              # [{id, title, duration_str, duration, url, added_by, added_at, file_path}]
+    "queue": SongQueue(),     # {id, title, duration_str, duration, url, added_by, added_at, file_path}
     "current_song": None,     # Şu an çalan şarkı (queue item)
     "playback_state": "idle", # "playing", "paused", "idle"
     "loop": False,            # Döngü modu
@@ -59,13 +97,27 @@ app_state = {
     "mic_volume": 80,         # Mikrofon çıkış sesi (0-100)
     "mic_muted": False,       # Mikrofon kapalı mı?
     "meet_link": None,        # Aktif Meet linki
+    "anchor": None,           # Çalma konumu çapası: {position, at, rate, paused, duration}
     "bot_status": "disconnected",  # "disconnected", "connecting", "connected"
 }
 
 song_id_counter = 0
 
+# Bot'un bildirdiği konum çapadan bu kadar (saniye) saparsa çapa yeniden yayınlanır
+DRIFT_TOLERANCE = 1.5
+
+# Kuyruk sürüm numarası — her queue_patch mesajında bir artar.
+# İstemci aradaki bir sürümü kaçırırsa "resync" ister ve state_sync alır.
+queue_seq = 0
+
+# Önbelleğe alınmış state_sync — sürüm değişene kadar tekrar serileştirilmez
+state_version = 0
+_snapshot_cache: Dict[str, tuple] = {}  # kodlama -> (sürüm, serileştirilmiş veri)
+
 # Bağlı WebSocket istemcileri
-connected_clients: List[WebSocket] = []
+connected_clients: List[ClientChannel] = []
+metrics.connected_clients.set_function(lambda: len(connected_clients))
+metrics.queue_depth.set_function(lambda: len(app_state["queue"]))
 
 # Bot callback — bot.py tarafından set edilecek
 bot_callback = None
@@ -111,7 +163,19 @@ class CustomHeaderMiddleware(BaseHTTPMiddleware):
 
 app.add_middleware(CustomHeaderMiddleware)
 
-app.mount("/downloads", StaticFiles(directory=DOWNLOADS_DIR), name="downloads")
+class AudioFiles(StaticFiles):
+    """
+    downloads/ altından sadece ses dosyalarını sun. Aynı klasördeki durum
+    (Meet linki içerir), index, metadata ve kullanım JSON'ları dışarı açılmaz.
+    """
+
+    async def get_response(self, path: str, scope):
+        if path.rpartition(".")[2].lower() not in AUDIO_EXTENSIONS:
+            raise HTTPException(status_code=404, detail="Dosya bulunamadı")
+        return await super().get_response(path, scope)
+
+
+app.mount("/downloads", AudioFiles(directory=DOWNLOADS_DIR), name="downloads")
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
 
@@ -121,30 +185,124 @@ async def serve_index():
     return FileResponse(os.path.join(STATIC_DIR, "index.html"))
 
 
+@app.get("/metrics")
+async def serve_metrics():
+    """Prometheus ölçümleri (metin formatı)."""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/stream/{key}")
+async def stream_audio(key: str):
+    """
+    Şarkıyı indirme bitmeden çalabilmek için büyüyen dosyayı akıtır.
+    İndirme bitmişse normal dosya olarak (Range destekli) döner.
+    """
+    found = find_stream_file(key)
+    if not found:
+        raise HTTPException(status_code=404, detail="Dosya bulunamadı")
+
+    path, ext, complete = found
+    media_type = STREAM_MEDIA_TYPES.get(ext, "application/octet-stream")
+    if complete:
+        return FileResponse(path, media_type=media_type)
+    return StreamingResponse(tail_download(key, ext), media_type=media_type)
+
+
 # ──────────────────────────────────────────────────────────────
 #  Broadcast — tüm bağlı istemcilere mesaj gönder
 # ──────────────────────────────────────────────────────────────
 
 async def broadcast(message: dict):
-    """Tüm bağlı WebSocket istemcilerine mesaj yayınla."""
-    data = json.dumps(message, ensure_ascii=False)
-    disconnected = []
-    for ws in connected_clients:
-        try:
-            await ws.send_text(data)
-        except Exception:
-            disconnected.append(ws)
-    for ws in disconnected:
-        if ws in connected_clients:
-            connected_clients.remove(ws)
+    """
+    Tüm bağlı WebSocket istemcilerine mesaj yayınla.
+    Mesaj her istemcinin kendi kuyruğuna konur; yavaş bir istemci
+    diğerlerini (ve çağıranı) bekletmez.
+    """
+    # Her durum değişikliği bir yayınla biter → önbellekteki durum artık eski
+    _mark_dirty()
+    with metrics.broadcast_seconds.time():
+        encoded: Dict[str, object] = {}  # Her kodlama için tek serileştirme
+        msg_type = message.get("type", "")
+        for client in list(connected_clients):
+            data = encoded.get(client.encoding)
+            if data is None:
+                data = encoded[client.encoding] = encode_message(message, client.encoding)
+            if not client.send_raw(msg_type, data) and client in connected_clients:
+                connected_clients.remove(client)
+
+
+async def publish_queue_ops(ops: list):
+    """Kuyruk değişikliğini sürüm numaralı bir fark (patch) olarak yayınla."""
+    global queue_seq
+    if not ops:
+        return
+    queue_seq += 1
+    await broadcast({"type": "queue_patch", "seq": queue_seq, "ops": ops})
+    _schedule_next_hint()
+
+
+_next_hint: Optional[str] = None  # Bota en son önceden yüklettiğimiz şarkının adresi
+
+
+def _schedule_next_hint():
+    """
+    Sıradaki şarkı hazırsa bota önceden yüklet (boşluksuz geçiş için).
+    Sadece ipucu değiştiğinde komut gönderilir. Çalan şarkı hazırlanırken
+    (çapa yokken) ipucu verilmez; sayfadaki ön yüklü parça o şarkının kendisi olabilir.
+    """
+    global _next_hint
+    current = app_state["current_song"]
+    if current and app_state["playback_state"] == "playing" and app_state["anchor"] is None:
+        return
+
+    song = None
+    if current and not app_state["loop"]:
+        head = app_state["queue"].head(1)
+        if head and head[0].get("file_path") and not head[0].get("_downloading"):
+            song = head[0]
+
+    url = _song_url(song) if song else None
+    if url == _next_hint or not bot_callback:
+        return
+    _next_hint = url
+    gain = track_gain_db(song["url"], song["file_path"]) if song else 0.0
+    asyncio.create_task(bot_callback("preload", {"url": url, "gain_db": gain}))
+
+
+def _mark_dirty():
+    """
+    app_state değişti: önbellekteki state_sync bir sonraki istekte yeniden
+    üretilir ve durum diske kaydedilmek üzere işaretlenir.
+    """
+    global state_version
+    state_version += 1
+    state_store.schedule_save()
+
+
+def get_state_snapshot(encoding: str):
+    """
+    Serileştirilmiş state_sync mesajı. Sürüm değişmedikçe aynı veri
+    döner; toplu yeniden bağlanmalarda sadece soket yazımı yapılır.
+    """
+    cached = _snapshot_cache.get(encoding)
+    if cached is None or cached[0] != state_version:
+        cached = _snapshot_cache[encoding] = (state_version, encode_message(get_full_state(), encoding))
+    return cached[1]
+
+
+def send_state(client: ClientChannel):
+    """İstemciye tam durumu ve saat eşitleme mesajını gönder."""
+    client.send_raw("state_sync", get_state_snapshot(client.encoding))
+    client.send({"type": "clock", "server_time": time.time()})
 
 
 def get_full_state() -> dict:
     """Güncel durumun tamamını döndür (yeni bağlanan için)."""
     return {
         "type": "state_sync",
-        "queue": app_state["queue"],
-        "current_song": app_state["current_song"],
+        "queue": [public_song(s) for s in app_state["queue"]],
+        "queue_seq": queue_seq,
+        "current_song": public_song(app_state["current_song"]),
         "playback_state": app_state["playback_state"],
         "loop": app_state["loop"],
         "music_volume": app_state["music_volume"],
@@ -152,24 +310,114 @@ def get_full_state() -> dict:
         "mic_muted": app_state.get("mic_muted", False),
         "meet_link": app_state["meet_link"],
         "bot_status": app_state["bot_status"],
+        "downloads": download_scheduler.status(),
+        "anchor": app_state["anchor"],
     }
 
 
+# ──────────────────────────────────────────────────────────────
+#  Kalıcı durum — yeniden başlatmada kuyruk ve ayarlar korunur
+# ──────────────────────────────────────────────────────────────
+
+# Diske yazılan şarkı alanları (dosya yolu açılışta önbellekten bulunur)
+_PERSISTED_SONG_FIELDS = ("id", "title", "duration", "duration_str", "url",
+                          "added_by", "added_at", "_lazy")
+
+# Geri yüklenen oturumda şarkı çalıyordu: bot Meet'e katılınca devam et
+_resume_after_join = False
+
+
+def _persisted_song(song: dict) -> dict:
+    return {k: song[k] for k in _PERSISTED_SONG_FIELDS if k in song}
+
+
+def _persisted_state() -> dict:
+    """Diske yazılacak durumun kopyası (event loop'ta alınır)."""
+    return {
+        "song_id_counter": song_id_counter,
+        "queue": [_persisted_song(s) for s in app_state["queue"]],
+        "current_song": _persisted_song(app_state["current_song"]) if app_state["current_song"] else None,
+        "playback_state": app_state["playback_state"],
+        "loop": app_state["loop"],
+        "music_volume": app_state["music_volume"],
+        "mic_volume": app_state["mic_volume"],
+        "mic_muted": app_state["mic_muted"],
+        "meet_link": app_state["meet_link"],
+    }
+
+
+state_store = StateStore(os.path.join(DOWNLOADS_DIR, current_room().state_file), _persisted_state)
+
+
+def restore_state():
+    """
+    Kayıtlı durumu app_state'e yükle. Yarıda kalan şarkı kuyruğun başına
+    konur, önbellekte dosyası olan şarkılar indirilmeden hazır sayılır.
+    """
+    global song_id_counter, _resume_after_join
+    saved = state_store.load()
+    if not saved:
+        return
+
+    songs = list(saved.get("queue", []))
+    if saved.get("current_song"):
+        songs.insert(0, saved["current_song"])
+
+    queue = SongQueue()
+    for song in songs:
+        if song["id"] in queue:
+            continue
+        song["file_path"] = audio_cache.peek(cache_key(song["url"]))
+        queue.append(song)
+
+    app_state["queue"] = queue
+    for field in ("loop", "music_volume", "mic_volume", "mic_muted", "meet_link"):
+        if field in saved:
+            app_state[field] = saved[field]
+    song_id_counter = max([saved.get("song_id_counter", 0)] + [s["id"] for s in songs])
+    _resume_after_join = bool(saved.get("current_song")) and saved.get("playback_state") == "playing"
+
+    ready = sum(1 for s in queue if s.get("file_path"))
+    print(f"♻️  Önceki durum geri yüklendi: {len(queue)} şarkı ({ready} tanesi önbellekte)")
+
+
+async def _resume_restored_session():
+    """
+    Bot Meet'e (yeniden) katıldığında sunucudaki ses ayarlarını ona uygula.
+    Geri yüklenen oturumda şarkı çalıyorduysa kuyruktan devam et.
+    """
+    global _resume_after_join
+    if not bot_callback:
+        return
+    await bot_callback("set_music_volume", {"value": app_state["music_volume"]})
+    await bot_callback("set_mic_volume", {"value": app_state["mic_volume"]})
+    if app_state["mic_muted"]:
+        await bot_callback("set_mic_mute", {"muted": True})
+
+    if _resume_after_join:
+        _resume_after_join = False
+        if app_state["playback_state"] == "idle" and app_state["queue"]:
+            asyncio.create_task(play_next())
+
+
 # ──────────────────────────────────────────────────────────────
 #  Şarkı yönetimi
 # ──────────────────────────────────────────────────────────────
 
 async def populate_song(song: dict):
-    """Arka planda şarkıyı indir ve file_path'i güncelle."""
-    if song.get("file_path") or song.get("_downloading"):
+    """Şarkıyı indir ve file_path'i güncelle (indirme sırası tarafından çağrılır)."""
+    if song.get("file_path"):
         return
 
     print(f"⬇️  Ön indirme başladı: {song['title']}")
-    song["_downloading"] = True
     try:
+        if song.get("_lazy"):
+            await _resolve_lazy_song(song)
         path = await download_audio(song["url"])
-        song["file_path"] = path
+        app_state["queue"].set_file_path(song, path)
+        _publish_cache_usage()
         print(f"✅  Ön indirme tamam: {song['title']}")
+        asyncio.create_task(_apply_track_gain(song))
         
         # Eğer indirilirken silindiyse dosyayı temizle
         if song.get("_removed"):
@@ -177,18 +425,136 @@ async def populate_song(song: dict):
             cleanup_song(song)
     except Exception as e:
         print(f"⚠️  Ön indirme hatası ({song['title']}): {e}")
-    finally:
-        song["_downloading"] = False
+        raise  # Hata indirme işine kaydedilir, bekleyen play_next hemen öğrenir
+
+
+def _new_song(url: str, metadata: dict, added_by: str, lazy: bool = False) -> dict:
+    """Kuyruk girdisi oluştur. lazy=True ise tam bilgi sırası gelince çözümlenir."""
+    global song_id_counter
+    song_id_counter += 1
+    song = {
+        "id": song_id_counter,
+        "title": metadata["title"],
+        "duration": metadata["duration"],
+        "duration_str": metadata["duration_str"],
+        "url": url,
+        "added_by": added_by,
+        "added_at": datetime.now().strftime("%H:%M"),
+        "file_path": None,
+    }
+    if lazy:
+        song["_lazy"] = True
+    return song
+
+
+_autoplay_pending = False
+
+
+def _start_or_prefetch():
+    """Hiçbir şey çalmıyorsa oynatmayı başlat, çalıyorsa sıradakileri indir."""
+    global _autoplay_pending
+    if app_state["playback_state"] == "idle" and not _autoplay_pending:
+        print("▶️  Otomatik oynatma başlatılıyor...")
+        _autoplay_pending = True  # play_next çalışana kadar ikinci kez tetiklenmesin
+        asyncio.create_task(play_next())
+    elif not _autoplay_pending:
+        # Sıradaki şarkıları kontrol et ve indir
+        print("⬇️  Arka planda indirme tetikleniyor...")
+        prefetch_next_songs()
+
+
+async def _ingest_playlist(url: str, added_by: str, client: ClientChannel):
+    """
+    Oynatma listesi girdilerini düz çözümlemeden geldikçe kuyruğa ekler.
+    Şarkıların tam bilgisi indirme sırası geldiğinde (populate_song) çekilir.
+    """
+    added = 0
+    try:
+        async for entries in iter_playlist(url):
+            songs = [_new_song(entry["url"], entry, added_by, lazy=True) for entry in entries]
+            if not songs:
+                continue
+            app_state["queue"].extend(songs)
+            added += len(songs)
+            print(f"📜  Oynatma listesinden {added} şarkı eklendi...")
+
+            await publish_queue_ops([insert_op(songs)])
+            _start_or_prefetch()
+    except Exception as e:
+        print(f"❌  Oynatma listesi hatası: {e}")
+        client.send({
+            "type": "error",
+            "message": f"Oynatma listesi alınamadı: {str(e)}"
+        })
+        if not added:
+            return
+
+    if added:
+        await broadcast({"type": "playlist_added", "count": added, "added_by": added_by})
+    else:
+        client.send({
+            "type": "error", "message": "Oynatma listesinde eklenebilir şarkı bulunamadı"
+        })
+
+
+async def _resolve_lazy_song(song: dict):
+    """Oynatma listesinden gelen şarkının tam bilgisini çek (indirme de bunu kullanır)."""
+    metadata = await get_metadata(song["url"])
+    song.pop("_lazy", None)
+    if (metadata["title"], metadata["duration"]) != (song["title"], song["duration"]):
+        song.update(metadata)
+        if not song.get("_removed"):
+            await publish_queue_ops([update_op(song["id"], metadata)])
+
+
+async def _apply_track_gain(song: dict):
+    """
+    Parçanın ses yüksekliği analizini (yoksa) yap. Analiz bittiğinde parça
+    çalıyorsa kazancı hemen uygula (akışla başlayan parçalar için).
+    """
+    try:
+        gain = await analyze_track(song["url"], song["file_path"])
+    except Exception as e:
+        print(f"⚠️  Ses yüksekliği analizi hatası: {e}")
+        return
+
+    if app_state["current_song"] is song and bot_callback and gain:
+        await bot_callback("set_track_gain", {"gain_db": gain})
+
+
+_download_status_pending = False
+
+
+def _on_download_status_change():
+    """İndirme durumları değişince (aynı turdaki değişiklikleri birleştirerek) yayınla."""
+    global _download_status_pending
+    if _download_status_pending:
+        return
+    _download_status_pending = True
+    asyncio.create_task(_broadcast_download_status())
+
+
+async def _broadcast_download_status():
+    global _download_status_pending
+    _download_status_pending = False
+    await broadcast({"type": "download_status", "downloads": download_scheduler.status()})
+    _schedule_next_hint()  # Sıradaki şarkının indirmesi bitmiş olabilir
+
+
+download_scheduler = DownloadScheduler(populate_song, on_change=_on_download_status_change)
 
 
 def prefetch_next_songs():
-    """Kuyruktaki sıradaki 2 şarkıyı önceden indir."""
-    next_songs = app_state["queue"][:2]
-    for song in next_songs:
-        asyncio.create_task(populate_song(song))
+    """Çalan şarkıyı ve kuyruktaki sıradaki şarkıları öncelik sırasıyla indir."""
+    wanted = []
+    if app_state["current_song"]:
+        wanted.append((app_state["current_song"], 0))
+    for i, song in enumerate(app_state["queue"].head(PREFETCH_COUNT)):
+        wanted.append((song, i + 1))
+    download_scheduler.sync(wanted)
 
 
-def is_file_in_use(file_path: str, exclude_song_id: int) -> bool:
+def is_file_in_use(file_path: str, exclude_song_id: Optional[int]) -> bool:
     """Belirtilen dosyanın kuyruktaki başka bir şarkı veya çalan şarkı tarafından kullanılıp kullanılmadığını kontrol eder."""
     if not file_path:
         return False
@@ -196,37 +562,61 @@ def is_file_in_use(file_path: str, exclude_song_id: int) -> bool:
     if app_state["current_song"] and app_state["current_song"].get("id") != exclude_song_id:
         if app_state["current_song"].get("file_path") == file_path:
             return True
-            
-    for s in app_state["queue"]:
-        if s.get("id") != exclude_song_id and s.get("file_path") == file_path:
-            return True
-            
-    return False
+
+    return app_state["queue"].file_in_use(file_path, exclude_song_id)
+
+
+def _files_in_use() -> List[str]:
+    """Kuyruktaki ve çalan şarkıların dosya yolları."""
+    paths = app_state["queue"].file_paths()
+    current = app_state["current_song"]
+    if current and current.get("file_path"):
+        paths.append(current["file_path"])
+    return paths
+
+
+def _publish_cache_usage():
+    """Kuyruktaki/çalan dosyaları diğer odalara bildir (ortak önbellekte silinmesinler)."""
+    try:
+        audio_cache.publish_in_use(_files_in_use())
+    except Exception as e:
+        print(f"⚠️  Önbellek kullanım bildirimi hatası: {e}")
 
 
 def cleanup_song(song: dict):
-    """Şarkı dosyasını sil (Eğer başka bir şarkı tarafından kullanılmıyorsa)."""
+    """
+    Şarkı kuyruktan çıktığında çağrılır. Dosya silinmez, önbellekte kalır;
+    artık kullanılmadığı için bütçe aşılmışsa önbellekten çıkarılabilir.
+    """
     if not song: return
     path = song.get("file_path")
     
     if path and os.path.exists(path):
         if is_file_in_use(path, song.get("id")):
-            print(f"💡  Dosya silinmedi, kuyruktaki başka bir şarkı tarafından kullanılıyor: {song['title']}")
+            print(f"💡  Dosya kuyruktaki başka bir şarkı tarafından da kullanılıyor: {song['title']}")
             return
             
-        try:
-            os.remove(path)
-            print(f"🗑️  Dosya silindi: {song['title']}")
-        except Exception as e:
-            print(f"⚠️  Dosya silinemedi: {e}")
+        _publish_cache_usage()
+        asyncio.create_task(_evict_cache())
+
+
+async def _evict_cache():
+    """Bütçe aşılmışsa önbellekten dosya çıkar (kilit thread'de beklenir)."""
+    try:
+        await audio_cache.evict()
+    except Exception as e:
+        print(f"⚠️  Önbellek temizliği hatası: {e}")
 
 
 async def play_next(force_cleanup=False):
     """Kuyruktaki sıradaki şarkıyı çal."""
-    
+    global _autoplay_pending
+    _autoplay_pending = False
+
     # Eski şarkıyı temizle (Eğer loop kapalıysa veya force_cleanup açıksa)
     old_song = app_state["current_song"]
     if old_song:
+        download_scheduler.cancel(old_song["id"])
         if force_cleanup or not app_state["loop"]:
             cleanup_song(old_song)
         # Looptaysa ve force_cleanup kapalıysa silme, tekrar oynatılacak
@@ -234,43 +624,55 @@ async def play_next(force_cleanup=False):
     if not app_state["queue"]:
         app_state["current_song"] = None
         app_state["playback_state"] = "idle"
+        _clear_anchor()
         await broadcast({"type": "playback_update", **_playback_info()})
         return
 
     # Sıradakini al
-    song = app_state["queue"].pop(0)
+    song = app_state["queue"].popleft()
+    started_at = time.perf_counter()
     app_state["current_song"] = song
     app_state["playback_state"] = "playing"
+    _clear_anchor()  # Şarkı hazırlanırken konum gösterilmez
+    await publish_queue_ops([remove_op(song["id"])])
 
     # Ön indirmeyi tetikle (bir sonraki şarkılar için)
     prefetch_next_songs()
 
     # Şarkıyı indir (Eğer prefetch yetişmediyse burada bekler)
     try:
-        if not song.get("file_path"):
-            # Eğer şu an indiriliyorsa bekle (Maks 60sn)
-            wait_counter = 0
-            while song.get("_downloading") and wait_counter < 120:
-                await asyncio.sleep(0.5)
-                wait_counter += 1
-            
-            if wait_counter >= 120:
-                print(f"⚠️  İndirme zaman aşımı (60sn): {song['title']}")
-                song["_downloading"] = False
-            
-            # Hala yoksa indir
-            if not song.get("file_path"):
-                file_path = await download_audio(song["url"])
-                song["file_path"] = file_path
+        stream_url = None
+        if not song.get("file_path") and PROGRESSIVE_PLAYBACK:
+            stream_url = await _wait_for_stream_start(song)
+
+        if not song.get("file_path") and not stream_url:
+            # Ön indirme sürüyorsa ona bağlan, yoksa en yüksek öncelikle başlat.
+            # Dosya hazır olduğu an devam edilir; hata varsa hemen düşülür.
+            job = download_scheduler.submit(song, 0)
+            await job.wait(PLAY_WAIT_TIMEOUT)
 
-        # Bot'a çal komutu gönder
+        # Bot'a çal komutu gönder (önceden hesaplanmış ses yüksekliği kazancıyla)
         if bot_callback:
-            filename = os.path.basename(song["file_path"])
             await bot_callback("play", {
-                "url": f"/downloads/{filename}",
-                "title": song["title"]
+                "url": stream_url or _song_url(song),
+                "title": song["title"],
+                "live": bool(stream_url) and not song.get("file_path"),
+                "gain_db": track_gain_db(song["url"], song.get("file_path")),
             })
-
+            metrics.time_to_first_audio_seconds.observe(time.perf_counter() - started_at)
+        if song.get("file_path") and not song.get("_downloading"):
+            asyncio.create_task(_apply_track_gain(song))
+        _set_anchor(0.0, paused=False, duration=song.get("duration") or 0)
+        _schedule_next_hint()
+
+    except DownloadFailed as e:
+        if e.reason == REASON_CANCELLED and app_state["current_song"] is not song:
+            return  # Beklerken atlandı/durduruldu, yerine geçen zaten çalıyor
+        print(f"⚠️  Şarkı indirilemedi ({song['title']}): {e}")
+        app_state["playback_state"] = "idle"
+        # Hatalı şarkıyı atla
+        await play_next()
+        return
     except Exception as e:
         print(f"⚠️  Şarkı indirme/çalma hatası: {e}")
         app_state["playback_state"] = "idle"
@@ -282,34 +684,116 @@ async def play_next(force_cleanup=False):
         "type": "playback_update",
         **_playback_info(),
     })
-    await broadcast({"type": "queue_update", "queue": app_state["queue"]})
+
+
+def _song_url(song: dict) -> str:
+    """Çalınacak ses dosyasının adresi (indirme bitmediyse akış adresi)."""
+    if song.get("file_path"):
+        return f"/downloads/{os.path.basename(song['file_path'])}"
+    return f"/stream/{cache_key(song['url'])}"
+
+
+async def _wait_for_stream_start(song: dict) -> str:
+    """
+    İndirmeyi başlat (veya süreni kullan) ve yeterli veri tamponlanınca
+    akış adresini döndür. İndirme başarısız olursa veya PLAY_WAIT_TIMEOUT
+    içinde ne tampon dolar ne indirme biterse DownloadFailed fırlatır.
+    """
+    job = download_scheduler.submit(song, 0)
+
+    key = cache_key(song["url"])
+    deadline = time.monotonic() + PLAY_WAIT_TIMEOUT
+    while not job.finished:
+        if buffered_bytes(key) >= STREAM_MIN_BYTES:
+            print(f"📡  Kademeli oynatma başlıyor: {song['title']}")
+            return f"/stream/{key}"
+        if time.monotonic() >= deadline:
+            raise DownloadFailed(REASON_TIMEOUT, f"{int(PLAY_WAIT_TIMEOUT)} sn içinde akış başlamadı")
+        # Tampon dolmasını yokla, indirme biterse beklemeden çık
+        try:
+            await asyncio.wait_for(job.done.wait(), 0.2)
+        except asyncio.TimeoutError:
+            pass
+
+    await job.wait()  # Başarısızsa DownloadFailed fırlatır
+    return _song_url(song)
 
 
 def _playback_info() -> dict:
     return {
-        "current_song": app_state["current_song"],
+        "current_song": public_song(app_state["current_song"]),
         "playback_state": app_state["playback_state"],
         "loop": app_state["loop"],
+        "anchor": app_state["anchor"],
+        "server_time": time.time(),
+    }
+
+
+# ── Çalma konumu çapası ──────────────────────────────────────
+# İstemciler konumu kendileri hesaplar: position + (şimdi - at) * rate.
+# Sunucu sadece çapa değiştiğinde (başlatma, duraklatma, sapma) yayın yapar.
+
+def _anchor_position(anchor: Optional[dict], now: Optional[float] = None) -> float:
+    """Çapaya göre şu anki tahmini konum (saniye)."""
+    if not anchor:
+        return 0.0
+    if anchor["paused"]:
+        return anchor["position"]
+    now = time.time() if now is None else now
+    position = anchor["position"] + (now - anchor["at"]) * anchor["rate"]
+    if anchor["duration"] > 0:
+        position = min(position, anchor["duration"])
+    return position
+
+
+def _set_anchor(position: float, paused: bool, duration: Optional[float] = None):
+    """Çapayı verilen konumdan yeniden kur (süre verilmezse eskisi korunur)."""
+    if duration is None:
+        old = app_state["anchor"]
+        song = app_state["current_song"]
+        duration = (old and old["duration"]) or (song and song.get("duration")) or 0
+    app_state["anchor"] = {
+        "position": round(position, 3),
+        "at": time.time(),
+        "rate": 1.0,
+        "paused": paused,
+        "duration": duration,
     }
 
 
+def _clear_anchor():
+    app_state["anchor"] = None
+
+
 async def on_song_ended():
     """Şarkı bittiğinde çağrılır (bot tarafından)."""
     if app_state["loop"] and app_state["current_song"]:
         # Döngü modunda — aynı şarkıyı tekrar çal
         song = app_state["current_song"]
         if bot_callback:
-            filename = os.path.basename(song["file_path"])
             await bot_callback("play", {
-                "url": f"/downloads/{filename}",
+                "url": _song_url(song),
                 "title": song["title"],
+                "live": not song.get("file_path"),
+                "gain_db": track_gain_db(song["url"], song.get("file_path")),
             })
+        _set_anchor(0.0, paused=False)
+        await broadcast({"type": "playback_anchor", "anchor": app_state["anchor"],
+                         "server_time": time.time()})
         return
 
     # Sonraki şarkıya geç
     await play_next()
 
 
+async def on_song_error(message: str):
+    """Çalan şarkı sayfada hata verdi (bot tarafından) — döngü açık olsa da atla."""
+    if app_state["current_song"] is None:
+        return
+    print(f"⏭️  Hatalı şarkı atlanıyor: {app_state['current_song']['title']} ({message})")
+    await play_next(force_cleanup=True)
+
+
 # ──────────────────────────────────────────────────────────────
 #  WebSocket Endpoint
 # ──────────────────────────────────────────────────────────────
@@ -318,26 +802,16 @@ async def on_song_ended():
 async def websocket_endpoint(ws: WebSocket):
     global song_id_counter
 
-    await ws.accept()
-    connected_clients.append(ws)
+    subprotocol, encoding = choose_encoding(ws.scope.get("subprotocols", []))
+    await ws.accept(subprotocol=subprotocol)
+    client = ClientChannel(ws, encoding=encoding)
+    client.start()
+    connected_clients.append(client)
     print(f"🔌  Yeni WebSocket bağlantısı (toplam: {len(connected_clients)})")
 
-    # Bağlanan kullanıcıya güncel durumu gönder
     # Bağlanan kullanıcıya güncel durumu gönder
     try:
-        current_state = {
-            "type": "state_sync",
-            "queue": app_state["queue"],
-            "current_song": app_state["current_song"],
-            "playback_state": app_state["playback_state"],
-            "loop": app_state["loop"],
-            "music_volume": app_state["music_volume"],
-            "mic_volume": app_state["mic_volume"],
-            "mic_muted": app_state["mic_muted"],
-            "bot_status": app_state["bot_status"],
-            "meet_link": app_state["meet_link"],
-        }
-        await ws.send_text(json.dumps(current_state, ensure_ascii=False))
+        send_state(client)
     except Exception as e:
         print(f"⚠️  İlk durum gönderilemedi: {e}")
 
@@ -357,9 +831,15 @@ async def websocket_endpoint(ws: WebSocket):
                 added_by = msg.get("added_by", "Anonim")
 
                 if not url:
-                    await ws.send_text(json.dumps({
+                    client.send({
                         "type": "error", "message": "URL boş olamaz"
-                    }))
+                    })
+                    continue
+
+                # Oynatma listesi: arka planda, geldikçe kuyruğa ekle
+                if is_playlist_url(url):
+                    print(f"📜  Oynatma listesi ekleniyor: {url} (İsteyen: {added_by})")
+                    asyncio.create_task(_ingest_playlist(url, added_by, client))
                     continue
 
                 print(f"🔍  Şarkı aranıyor: {url} (İsteyen: {added_by})")
@@ -368,43 +848,21 @@ async def websocket_endpoint(ws: WebSocket):
                     print(f"✅  Metadata bulundu: {metadata['title']}")
                 except Exception as e:
                     print(f"❌  Metadata hatası: {e}")
-                    await ws.send_text(json.dumps({
+                    client.send({
                         "type": "error",
                         "message": f"Şarkı bilgisi alınamadı: {str(e)}"
-                    }))
+                    })
                     continue
 
-                song_id_counter += 1
-                song = {
-                    "id": song_id_counter,
-                    "title": metadata["title"],
-                    "duration": metadata["duration"],
-                    "duration_str": metadata["duration_str"],
-                    "url": url,
-                    "added_by": added_by,
-                    "added_at": datetime.now().strftime("%H:%M"),
-                    "file_path": None,
-                }
+                song = _new_song(url, metadata, added_by)
                 app_state["queue"].append(song)
                 print(f"➕  Kuyruğa eklendi: {song['title']}")
 
-                await broadcast({
-                    "type": "queue_update",
-                    "queue": app_state["queue"],
-                })
-                await broadcast({
-                    "type": "song_added",
-                    "song": song,
-                })
+                op = insert_op([song])
+                op["announce"] = True  # İstemciler "kuyruğa eklendi" bildirimi göstersin
+                await publish_queue_ops([op])
 
-                # Eğer hiçbir şey çalmıyorsa, otomatik başlat
-                if app_state["playback_state"] == "idle":
-                    print("▶️  Otomatik oynatma başlatılıyor...")
-                    asyncio.create_task(play_next())
-                else:
-                    # Sıradaki şarkıları kontrol et ve indir
-                    print("⬇️  Arka planda indirme tetikleniyor...")
-                    prefetch_next_songs()
+                _start_or_prefetch()
 
             # ── Skip (Geç) ──────────────────────────────────
             elif msg_type == "skip":
@@ -421,10 +879,12 @@ async def websocket_endpoint(ws: WebSocket):
                 
                 # Çalan şarkıyı temizle
                 if app_state["current_song"]:
+                    download_scheduler.cancel(app_state["current_song"]["id"])
                     cleanup_song(app_state["current_song"])
                 
                 app_state["playback_state"] = "idle"
                 app_state["current_song"] = None
+                _clear_anchor()
                 await broadcast({"type": "playback_update", **_playback_info()})
 
             # ── Pause (Duraklat) ────────────────────────────
@@ -434,6 +894,8 @@ async def websocket_endpoint(ws: WebSocket):
                     app_state["playback_state"] = "paused"
                     if bot_callback:
                         await bot_callback("pause", {})
+                    if app_state["anchor"]:
+                        _set_anchor(_anchor_position(app_state["anchor"]), paused=True)
                     await broadcast({"type": "playback_update", **_playback_info()})
 
             # ── Resume (Başlat/Devam Et) ────────────────────
@@ -443,6 +905,8 @@ async def websocket_endpoint(ws: WebSocket):
                     app_state["playback_state"] = "playing"
                     if bot_callback:
                         await bot_callback("resume", {})
+                    if app_state["anchor"]:
+                        _set_anchor(app_state["anchor"]["position"], paused=False)
                     await broadcast({"type": "playback_update", **_playback_info()})
                 elif app_state["playback_state"] == "idle" and app_state["queue"]:
                     print("▶️  Kuyruktan oynatma başlatılıyor...")
@@ -452,6 +916,7 @@ async def websocket_endpoint(ws: WebSocket):
             elif msg_type == "loop":
                 app_state["loop"] = not app_state["loop"]
                 print(f"🔁  Döngü modu: {'Açık' if app_state['loop'] else 'Kapalı'}")
+                _schedule_next_hint()  # Döngüde sayfa kendiliğinden sonraki parçaya geçmesin
                 await broadcast({"type": "playback_update", **_playback_info()})
 
             # ── Kuyruk Sıralama (Drag-and-Drop) ────────────
@@ -461,29 +926,18 @@ async def websocket_endpoint(ws: WebSocket):
                     continue
 
                 print("list  Kuyruk yeniden sıralanıyor...")
-                # Mevcut kuyruğu map'le
-                current_queue_map = {item["id"]: item for item in app_state["queue"]}
-
-                # Yeni sıralamayı oluştur
-                new_queue = []
-                for q_id in new_ids:
-                    if q_id in current_queue_map:
-                        new_queue.append(current_queue_map[q_id])
-
-                # Listede olup da yeni sıralamada olmayanları (varsa) sona ekle
-                for item in app_state["queue"]:
-                    if item["id"] not in new_ids:
-                        new_queue.append(item)
-
-                app_state["queue"] = new_queue
+                queue = app_state["queue"]
+                # Listede olup da yeni sıralamada olmayanlar (varsa) sona eklenir
+                final_ids = queue.complete_order(new_ids)
+                # Sadece yer değiştiren şarkılar taşınır (sürükle-bırak → tek move)
+                ops = reorder_ops(queue.ids(), final_ids)
+                for op in ops:
+                    queue.move(op["id"], op["before"])
                 
                 # Yeni sıralamaya göre ön indirme yap
                 prefetch_next_songs()
 
-                await broadcast({
-                    "type": "queue_update",
-                    "queue": app_state["queue"],
-                })
+                await publish_queue_ops(ops)
 
             # ── Mikrofon Toggle (Aç/Kapa) ──────────────────
             elif msg_type == "toggle_mic":
@@ -524,17 +978,17 @@ async def websocket_endpoint(ws: WebSocket):
             elif msg_type == "join_meet":
                 link = msg.get("link", "").strip()
                 if not link:
-                    await ws.send_text(json.dumps({
+                    client.send({
                         "type": "error", "message": "Meet linki boş olamaz"
-                    }))
+                    })
                     continue
 
                 import re
                 match = re.search(r"https://meet\.google\.com/[a-z0-9\-]+", link, re.IGNORECASE)
                 if not match:
-                    await ws.send_text(json.dumps({
+                    client.send({
                         "type": "error", "message": "Geçersiz Meet linki"
-                    }))
+                    })
                     continue
                 
                 link = match.group(0) # Fazlalıkları sil
@@ -557,6 +1011,7 @@ async def websocket_endpoint(ws: WebSocket):
             elif msg_type == "leave_meet":
                 print("👋  Meet'ten ayrılma isteği.")
                 app_state["meet_link"] = None
+                _mark_dirty()
                 # Bot'a ayrıl komutu gönder
                 if bot_callback:
                     asyncio.create_task(bot_callback("leave_meet", {}))
@@ -569,29 +1024,29 @@ async def websocket_endpoint(ws: WebSocket):
             elif msg_type == "remove_song":
                 song_id = msg.get("id")
                 
-                # Silinecek şarkıyı bul ve temizle
-                song_to_remove = next((s for s in app_state["queue"] if s["id"] == song_id), None)
+                # Silinecek şarkıyı çıkar ve temizle
+                song_to_remove = app_state["queue"].remove(song_id)
                 if song_to_remove:
                     song_to_remove["_removed"] = True
+                    download_scheduler.cancel(song_id)
                     cleanup_song(song_to_remove)
-                    
-                original_len = len(app_state["queue"])
-                app_state["queue"] = [s for s in app_state["queue"] if s["id"] != song_id]
-                if len(app_state["queue"]) < original_len:
-                     print(f"🗑️  Kuyruktan şarkı çıkarıldı (ID: {song_id})")
+                    print(f"🗑️  Kuyruktan şarkı çıkarıldı (ID: {song_id})")
+                    # Boşalan ön indirme yerini doldur
+                    prefetch_next_songs()
+                    await publish_queue_ops([remove_op(song_id)])
 
-                await broadcast({
-                    "type": "queue_update",
-                    "queue": app_state["queue"],
-                })
+            # ── Tam durum isteği (istemci bir patch kaçırdıysa) ──
+            elif msg_type == "resync":
+                send_state(client)
 
     except WebSocketDisconnect:
         pass
     except Exception as e:
         print(f"⚠️  WebSocket hatası: {e}")
     finally:
-        if ws in connected_clients:
-            connected_clients.remove(ws)
+        client.close()
+        if client in connected_clients:
+            connected_clients.remove(client)
         print(f"🔌  WebSocket bağlantı koptu (kalan: {len(connected_clients)})")
 
 
@@ -601,16 +1056,40 @@ async def websocket_endpoint(ws: WebSocket):
 
 async def update_bot_status(status: str):
     """Bot durumunu güncelle ve broadcast et."""
+    global _next_hint
+    previous = app_state["bot_status"]
     app_state["bot_status"] = status
     await broadcast({"type": "bot_status", "status": status, "meet_link": app_state["meet_link"]})
+    if status == "connected" and previous != "connected":
+        _next_hint = None  # Yeni sayfada ön yüklü parça yok
+        await _resume_restored_session()
+        _schedule_next_hint()
 
 
 async def update_playback_progress(current: float, total: float):
-    """Şarkı ilerlemesini broadcast et."""
-    # Sadece playing durumundaysa gönder (gereksiz trafik olmasın)
-    #if app_state["playback_state"] == "playing":
+    """
+    Bot'un bildirdiği konumu çapayla karşılaştır. Her saniye yayın yapılmaz;
+    sadece sapma DRIFT_TOLERANCE'ı aşınca veya süre öğrenilince çapa
+    yeniden kurulup yayınlanır.
+    """
+    anchor = app_state["anchor"]
+    # Çapa yoksa şarkı henüz başlamadı (hazırlanıyor veya durduruldu)
+    if not anchor or not app_state["current_song"]:
+        return
+
+    # Akış halinde çalarken tarayıcı süreyi bilemez, bilinen süreyi kullan
+    if total <= 0:
+        total = anchor["duration"]
+
+    paused = app_state["playback_state"] == "paused"
+    if (anchor["paused"] == paused
+            and abs(_anchor_position(anchor) - current) <= DRIFT_TOLERANCE
+            and abs(anchor["duration"] - total) < 1):
+        return
+
+    _set_anchor(current, paused=paused, duration=total)
     await broadcast({
-        "type": "progress_update",
-        "current": current,
-        "total": total
+        "type": "playback_anchor",
+        "anchor": app_state["anchor"],
+        "server_time": time.time(),
     })
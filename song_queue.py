@@ -0,0 +1,177 @@
+# ──────────────────────────────────────────────────────────────
+#  song_queue.py — Büyük kuyruklar için indeksli şarkı kuyruğu
+#  Çift yönlü bağlı liste + id → düğüm indeksi: baştan alma, silme ve
+#  taşıma O(1). Dosya yolu başına referans sayısı tutulduğu için
+#  "bu dosyayı kuyrukta kullanan var mı?" sorusu da tek bir sözlük bakışı.
+# ──────────────────────────────────────────────────────────────
+
+from typing import Dict, Iterable, Iterator, List, Optional
+
+
+class _Node:
+    __slots__ = ("song", "prev", "next")
+
+    def __init__(self, song: dict):
+        self.song = song
+        self.prev: Optional["_Node"] = None
+        self.next: Optional["_Node"] = None
+
+
+class SongQueue:
+    """
+    Şarkı kuyruğu. Liste gibi gezilebilir (for, len, bool).
+    Kuyruktaki şarkıların file_path'i sadece set_file_path() ile
+    değiştirilmelidir, aksi halde referans sayıları kayar.
+    """
+
+    def __init__(self, songs: Iterable[dict] = ()):
+        self._head: Optional[_Node] = None
+        self._tail: Optional[_Node] = None
+        self._index: Dict[int, _Node] = {}      # song_id -> düğüm
+        self._file_refs: Dict[str, int] = {}    # file_path -> kuyruktaki kullanım sayısı
+        self.extend(songs)
+
+    # ── Okuma ────────────────────────────────────────────────
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __bool__(self) -> bool:
+        return self._head is not None
+
+    def __iter__(self) -> Iterator[dict]:
+        node = self._head
+        while node:
+            yield node.song
+            node = node.next
+
+    def __contains__(self, song_id: int) -> bool:
+        return song_id in self._index
+
+    def head(self, n: int) -> List[dict]:
+        """Baştaki en fazla n şarkı."""
+        result = []
+        node = self._head
+        while node and len(result) < n:
+            result.append(node.song)
+            node = node.next
+        return result
+
+    def ids(self) -> List[int]:
+        return [song["id"] for song in self]
+
+    def complete_order(self, new_ids: List[int]) -> List[int]:
+        """
+        İstemcinin gönderdiği sırayı kuyruğa uydur: bilinmeyen ve tekrarlanan
+        id'ler atlanır, listede olmayan şarkılar mevcut sıralarıyla sona eklenir.
+        """
+        order: List[int] = []
+        seen = set()
+        for song_id in new_ids:
+            if song_id in self._index and song_id not in seen:
+                seen.add(song_id)
+                order.append(song_id)
+        order.extend(song_id for song_id in self.ids() if song_id not in seen)
+        return order
+
+    def file_paths(self) -> List[str]:
+        """Kuyruktaki şarkıların kullandığı (farklı) dosya yolları."""
+        return list(self._file_refs)
+
+    def file_in_use(self, file_path: str, exclude_song_id: Optional[int] = None) -> bool:
+        """Dosyayı kuyrukta (exclude_song_id dışında) kullanan şarkı var mı?"""
+        refs = self._file_refs.get(file_path, 0)
+        if refs and exclude_song_id is not None:
+            node = self._index.get(exclude_song_id)
+            if node and node.song.get("file_path") == file_path:
+                refs -= 1
+        return refs > 0
+
+    # ── Değiştirme ───────────────────────────────────────────
+
+    def append(self, song: dict):
+        if song["id"] in self._index:
+            raise ValueError(f"Şarkı zaten kuyrukta: {song['id']}")
+        node = _Node(song)
+        self._index[song["id"]] = node
+        self._link(node, None)
+        self._add_ref(song.get("file_path"))
+
+    def extend(self, songs: Iterable[dict]):
+        for song in songs:
+            self.append(song)
+
+    def popleft(self) -> dict:
+        if self._head is None:
+            raise IndexError("Kuyruk boş")
+        return self.remove(self._head.song["id"])
+
+    def remove(self, song_id: int) -> Optional[dict]:
+        """Şarkıyı kuyruktan çıkar ve döndür (yoksa None)."""
+        node = self._index.pop(song_id, None)
+        if node is None:
+            return None
+        self._unlink(node)
+        self._drop_ref(node.song.get("file_path"))
+        return node.song
+
+    def move(self, song_id: int, before_id: Optional[int] = None):
+        """Şarkıyı before_id'nin önüne taşı (None → sona)."""
+        node = self._index[song_id]
+        before = self._index[before_id] if before_id is not None else None
+        if before is node:
+            return
+        self._unlink(node)
+        self._link(node, before)
+
+    def set_file_path(self, song: dict, path: Optional[str]):
+        """Şarkının dosya yolunu değiştir (kuyruktaysa referans sayısını güncelle)."""
+        if song["id"] in self._index and self._index[song["id"]].song is song:
+            self._drop_ref(song.get("file_path"))
+            self._add_ref(path)
+        song["file_path"] = path
+
+    # ── İç işleyiş ──────────────────────────────────────────
+
+    def _link(self, node: _Node, before: Optional[_Node]):
+        """Düğümü before'un önüne (None → sona) bağla."""
+        if before is None:
+            node.prev = self._tail
+            node.next = None
+            if self._tail:
+                self._tail.next = node
+            else:
+                self._head = node
+            self._tail = node
+        else:
+            node.prev = before.prev
+            node.next = before
+            if before.prev:
+                before.prev.next = node
+            else:
+                self._head = node
+            before.prev = node
+
+    def _unlink(self, node: _Node):
+        if node.prev:
+            node.prev.next = node.next
+        else:
+            self._head = node.next
+        if node.next:
+            node.next.prev = node.prev
+        else:
+            self._tail = node.prev
+        node.prev = node.next = None
+
+    def _add_ref(self, path: Optional[str]):
+        if path:
+            self._file_refs[path] = self._file_refs.get(path, 0) + 1
+
+    def _drop_ref(self, path: Optional[str]):
+        if not path:
+            return
+        refs = self._file_refs.get(path, 0) - 1
+        if refs > 0:
+            self._file_refs[path] = refs
+        else:
+            self._file_refs.pop(path, None)
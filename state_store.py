@@ -0,0 +1,102 @@
+# ──────────────────────────────────────────────────────────────
+#  state_store.py — Kuyruk ve çalma durumunun diske kaydı
+#  Her değişiklikte kısa bir gecikmeyle (debounce) sıkıştırılmış tek bir
+#  anlık görüntü yazılır. Serileştirme ve yazma event loop dışında
+#  (thread'de) yapılır. Açılışta bu dosyadan kaldığı yerden devam edilir.
+# ──────────────────────────────────────────────────────────────
+
+import asyncio
+import json
+import os
+from typing import Any, Callable, Optional
+
+STATE_VERSION = 1
+SAVE_DEBOUNCE = 1.0   # saniye — art arda gelen değişiklikler tek yazıma indirgenir
+
+
+class DebouncedWriter:
+    """
+    Art arda gelen değişiklikleri tek yazıma indirger.
+    snapshot() event loop'ta çağrılır (tutarlı kopya), write(kopya) thread'de çalışır.
+    """
+
+    def __init__(self, snapshot: Callable[[], Any], write: Callable[[Any], None],
+                 delay: float = SAVE_DEBOUNCE):
+        self._snapshot = snapshot
+        self._write = write
+        self.delay = delay
+        self._dirty = False
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()   # Yazımlar sırayla — eski görüntü yenisinin üstüne yazılmasın
+
+    def schedule(self):
+        """Değişiklik oldu: kısa bir gecikmeyle yaz."""
+        self._dirty = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._save_later())
+
+    async def flush(self):
+        """Bekleyen değişiklik varsa hemen yaz."""
+        if self._dirty:
+            await self.save()
+
+    async def save(self):
+        """Güncel görüntüyü hemen yaz."""
+        async with self._lock:
+            self._dirty = False
+            snapshot = self._snapshot()
+            await asyncio.to_thread(self._write, snapshot)
+
+    async def _save_later(self):
+        await asyncio.sleep(self.delay)
+        while self._dirty:
+            await self.save()
+
+
+class StateStore:
+    """
+    build() o anki durumun JSON'a çevrilebilir bir kopyasını döndürmelidir.
+    Kopya event loop'ta alınır (tutarlı olsun diye), diske yazma thread'de yapılır.
+    """
+
+    def __init__(self, path: str, build: Callable[[], dict]):
+        self.path = path
+        self._build = build
+        self._closed = False
+        self._writer = DebouncedWriter(
+            lambda: {"version": STATE_VERSION, **self._build()}, self._write)
+
+    def load(self) -> Optional[dict]:
+        """Kayıtlı durumu oku. Dosya yoksa, bozuksa veya sürümü farklıysa None."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Kayıtlı durum okunamadı: {e}")
+            return None
+
+        if saved.get("version") != STATE_VERSION:
+            return None
+        return saved
+
+    def schedule_save(self):
+        """Durum değişti: kısa bir gecikmeyle diske yaz."""
+        if self._closed:
+            return
+        self._writer.schedule()
+
+    async def flush(self, close: bool = False):
+        """Güncel durumu hemen yaz (kapanışta). close=True sonrası kayıt yapılmaz."""
+        self._closed = close
+        await self._writer.save()
+
+    def _write(self, snapshot: dict):
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠️  Durum kaydedilemedi: {e}")
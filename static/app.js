@@ -26,6 +26,7 @@
 
     let state = {
         queue: [],
+        queue_seq: 0,         // Son uygulanan queue_patch sürümü
         current_song: null,
         playback_state: "idle",
         loop: false,
@@ -34,9 +35,13 @@
         mic_muted: false,
         bot_status: "disconnected",
         meet_link: null,
+        downloads: {},        // { song_id: "queued" | "downloading" | "ready" | "failed" }
+        anchor: null,         // { position, at, rate, paused, duration } — konum buradan hesaplanır
     };
 
     let isAdmin = false;
+    let resyncRequested = false;  // Kaçan patch için tam durum istendi mi
+    let clockOffset = 0;          // sunucu saati - yerel saat (saniye)
 
     // ── DOM Referansları ───────────────────────────────────────
     const $ = (sel) => document.querySelector(sel);
@@ -163,13 +168,96 @@
 
 
     // ── WebSocket ─────────────────────────────────────────────
+    // ── MessagePack Çözücü ────────────────────────────────────
+    // Sunucu "meetbot.msgpack" alt protokolünü kabul ederse mesajlar ikili
+    // gelir ve alan adları kısaltılmıştır (client_channel.py FIELD_TAGS).
+    // localStorage.meetbot_encoding = "json" ile JSON'a zorlanabilir.
+    const FIELD_TAGS = new Map(Object.entries({
+        i: "id", t: "title", d: "duration", ds: "duration_str", u: "url",
+        b: "added_by", a: "added_at", r: "ready", bf: "before", it: "items", f: "fields",
+    }));
+    const textDecoder = new TextDecoder();
+
+    function decodeMsgpack(buffer) {
+        const view = new DataView(buffer);
+        const bytes = new Uint8Array(buffer);
+        let pos = 0;
+
+        function str(len) {
+            const value = textDecoder.decode(bytes.subarray(pos, pos + len));
+            pos += len;
+            return value;
+        }
+        function arr(len) {
+            const out = new Array(len);
+            for (let i = 0; i < len; i++) out[i] = read();
+            return out;
+        }
+        function map(len) {
+            const out = {};
+            for (let i = 0; i < len; i++) {
+                const key = read();
+                out[FIELD_TAGS.get(key) ?? key] = read();
+            }
+            return out;
+        }
+        function bin(len) {
+            const value = bytes.slice(pos, pos + len);
+            pos += len;
+            return value;
+        }
+
+        function read() {
+            const b = bytes[pos++];
+            if (b <= 0x7f) return b;
+            if (b >= 0xe0) return b - 0x100;
+            if ((b & 0xf0) === 0x80) return map(b & 0x0f);
+            if ((b & 0xf0) === 0x90) return arr(b & 0x0f);
+            if ((b & 0xe0) === 0xa0) return str(b & 0x1f);
+
+            let v;
+            switch (b) {
+                case 0xc0: return null;
+                case 0xc2: return false;
+                case 0xc3: return true;
+                case 0xc4: v = view.getUint8(pos); pos += 1; return bin(v);
+                case 0xc5: v = view.getUint16(pos); pos += 2; return bin(v);
+                case 0xc6: v = view.getUint32(pos); pos += 4; return bin(v);
+                case 0xca: v = view.getFloat32(pos); pos += 4; return v;
+                case 0xcb: v = view.getFloat64(pos); pos += 8; return v;
+                case 0xcc: v = view.getUint8(pos); pos += 1; return v;
+                case 0xcd: v = view.getUint16(pos); pos += 2; return v;
+                case 0xce: v = view.getUint32(pos); pos += 4; return v;
+                case 0xcf: v = Number(view.getBigUint64(pos)); pos += 8; return v;
+                case 0xd0: v = view.getInt8(pos); pos += 1; return v;
+                case 0xd1: v = view.getInt16(pos); pos += 2; return v;
+                case 0xd2: v = view.getInt32(pos); pos += 4; return v;
+                case 0xd3: v = Number(view.getBigInt64(pos)); pos += 8; return v;
+                case 0xd9: v = view.getUint8(pos); pos += 1; return str(v);
+                case 0xda: v = view.getUint16(pos); pos += 2; return str(v);
+                case 0xdb: v = view.getUint32(pos); pos += 4; return str(v);
+                case 0xdc: v = view.getUint16(pos); pos += 2; return arr(v);
+                case 0xdd: v = view.getUint32(pos); pos += 4; return arr(v);
+                case 0xde: v = view.getUint16(pos); pos += 2; return map(v);
+                case 0xdf: v = view.getUint32(pos); pos += 4; return map(v);
+            }
+            throw new Error(`Desteklenmeyen msgpack baytı: 0x${b.toString(16)}`);
+        }
+
+        return read();
+    }
+
     function connectWS() {
         if (ws && (ws.readyState === WebSocket.OPEN || ws.readyState === WebSocket.CONNECTING)) {
             return;
         }
 
         const protocol = location.protocol === "https:" ? "wss:" : "ws:";
-        ws = new WebSocket(`${protocol}//${location.host}/ws`);
+        const subprotocols = localStorage.getItem("meetbot_encoding") === "json"
+            ? ["meetbot.json"]
+            : ["meetbot.msgpack", "meetbot.json"];
+        ws = new WebSocket(`${protocol}//${location.host}/ws`, subprotocols);
+        ws.binaryType = "arraybuffer";
 
         ws.onopen = () => {
             console.log("[WS] Bağlantı kuruldu");
@@ -188,7 +276,9 @@
 
         ws.onmessage = (event) => {
             try {
-                const msg = JSON.parse(event.data);
+                const msg = event.data instanceof ArrayBuffer
+                    ? decodeMsgpack(event.data)
+                    : JSON.parse(event.data);
                 handleMessage(msg);
             } catch (e) {
                 console.error("[WS] Parse hatası:", e);
@@ -211,21 +301,34 @@
         switch (msg.type) {
             case "state_sync":
                 state = { ...state, ...msg };
+                resyncRequested = false;
                 renderAll();
                 break;
 
-            case "queue_update":
-                state.queue = msg.queue || [];
-                renderQueue();
-                renderControls();
+            case "queue_patch":
+                handleQueuePatch(msg);
                 break;
 
             case "playback_update":
                 state.current_song = msg.current_song;
                 state.playback_state = msg.playback_state;
                 state.loop = msg.loop;
+                state.anchor = msg.anchor;
+                syncClock(msg.server_time);
                 renderNowPlaying();
                 renderControls();
+                renderProgress();
+                break;
+
+            case "clock":
+                syncClock(msg.server_time);
+                renderProgress();
+                break;
+
+            case "playback_anchor":
+                state.anchor = msg.anchor;
+                syncClock(msg.server_time);
+                renderProgress();
                 break;
 
             case "volume_update":
@@ -245,14 +348,13 @@
                 renderBotStatus();
                 break;
 
-            case "song_added":
-                showToast(`🎵 "${msg.song.title}" kuyruğa eklendi`, "success");
+            case "download_status":
+                state.downloads = msg.downloads || {};
+                renderQueue();
                 break;
 
-            case "progress_update":
-                if (msg.total > 0) {
-                    npTime.textContent = `${formatTime(msg.current)} / ${formatTime(msg.total)}`;
-                }
+            case "playlist_added":
+                showToast(`📜 Oynatma listesinden ${msg.count} şarkı kuyruğa eklendi`, "success");
                 break;
 
             case "error":
@@ -262,10 +364,105 @@
     }
 
 
+    // ── Kuyruk Patch'leri ─────────────────────────────────────
+    function handleQueuePatch(msg) {
+        if (msg.seq <= state.queue_seq) return;  // Eski / tekrar gelen patch
+        if (msg.seq !== state.queue_seq + 1) {
+            // Arada kaçan bir sürüm var → tam durumu iste
+            if (!resyncRequested) {
+                resyncRequested = true;
+                send({ type: "resync" });
+            }
+            return;
+        }
+
+        for (const op of msg.ops) {
+            applyQueueOp(op);
+        }
+        state.queue_seq = msg.seq;
+        renderQueue();
+        renderControls();
+    }
+
+    function queueIndex(id) {
+        return state.queue.findIndex((s) => s.id === id);
+    }
+
+    function insertBefore(items, beforeId) {
+        const idx = beforeId == null ? -1 : queueIndex(beforeId);
+        if (idx === -1) {
+            state.queue.push(...items);
+        } else {
+            state.queue.splice(idx, 0, ...items);
+        }
+    }
+
+    function applyQueueOp(op) {
+        switch (op.op) {
+            case "insert":
+                insertBefore(op.items, op.before);
+                if (op.announce && op.items.length === 1) {
+                    showToast(`🎵 "${op.items[0].title}" kuyruğa eklendi`, "success");
+                }
+                break;
+
+            case "remove": {
+                const idx = queueIndex(op.id);
+                if (idx !== -1) state.queue.splice(idx, 1);
+                break;
+            }
+
+            case "move": {
+                const idx = queueIndex(op.id);
+                if (idx === -1) break;
+                const [song] = state.queue.splice(idx, 1);
+                insertBefore([song], op.before);
+                break;
+            }
+
+            case "update": {
+                const idx = queueIndex(op.id);
+                if (idx !== -1) Object.assign(state.queue[idx], op.fields);
+                break;
+            }
+        }
+    }
+
+
+    // ── Çalma Konumu (çapadan yerel hesap) ────────────────────
+    function syncClock(serverTime) {
+        if (typeof serverTime === "number") {
+            clockOffset = serverTime - Date.now() / 1000;
+        }
+    }
+
+    function anchorPosition(anchor) {
+        if (anchor.paused) return anchor.position;
+        const now = Date.now() / 1000 + clockOffset;
+        const position = anchor.position + (now - anchor.at) * anchor.rate;
+        return anchor.duration > 0 ? Math.min(position, anchor.duration) : position;
+    }
+
+    function renderProgress() {
+        const anchor = state.anchor;
+        if (!state.current_song) return;
+        if (!anchor || !(anchor.duration > 0)) {
+            npTime.textContent = "--:-- / --:--";
+            return;
+        }
+        const current = Math.max(0, anchorPosition(anchor));
+        npTime.textContent = `${formatTime(current)} / ${formatTime(anchor.duration)}`;
+    }
+
+    // Sunucu her saniye ilerleme göndermez; ekranı yerelde güncelle
+    setInterval(renderProgress, 500);
+
+
     // ── Render Fonksiyonları ───────────────────────────────────
     function renderAll() {
         renderQueue();
         renderNowPlaying();
+        renderProgress();
         renderControls();
         renderVolume();
         renderBotStatus();
@@ -314,6 +511,7 @@
                             <span class="flex items-center gap-1"><span class="material-symbols-outlined text-[14px]">schedule</span> ${song.duration_str}</span>
                             <span class="w-1.5 h-1.5 rounded-none bg-fuchsia"></span>
                             <span class="flex items-center gap-1"><span class="material-symbols-outlined text-[14px]">person</span> ${escapeHtml(song.added_by)}</span>
+                            ${renderDownloadBadge(song)}
                         </div>
                     </div>
                 </div>
@@ -332,6 +530,19 @@
         });
     }
 
+    function renderDownloadBadge(song) {
+        const dlState = (state.downloads || {})[song.id] || (song.ready ? "ready" : null);
+        const badges = {
+            queued: ["schedule", "İndirme sırasında", "opacity-60"],
+            downloading: ["downloading", "İndiriliyor", "animate-pulse text-teal"],
+            ready: ["download_done", "Hazır", "text-teal"],
+            failed: ["error", "İndirilemedi", "text-fuchsia"],
+        };
+        const badge = badges[dlState];
+        if (!badge) return "";
+        return `<span class="flex items-center gap-1 ${badge[2]}" title="${badge[1]}"><span class="material-symbols-outlined text-[14px]">${badge[0]}</span></span>`;
+    }
+
     function addDragEvents(item) {
         item.addEventListener("dragstart", handleDragStart);
         item.addEventListener("dragenter", handleDragEnter);
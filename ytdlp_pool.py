@@ -0,0 +1,251 @@
+# ──────────────────────────────────────────────────────────────
+#  ytdlp_pool.py — Kalıcı yt-dlp işçi süreçleri havuzu
+#  Her işçi yt_dlp kütüphanesini bir kez import eder ve işleri
+#  Pipe üzerinden alır. Böylece her çağrıda yorumlayıcı başlatma
+#  ve extractor import maliyeti ödenmez.
+# ──────────────────────────────────────────────────────────────
+
+import asyncio
+import multiprocessing
+import os
+from typing import AsyncIterator, List, Optional
+
+POOL_SIZE = int(os.environ.get("MEETBOT_YTDLP_WORKERS", "3"))
+METADATA_TIMEOUT = 60    # saniye
+DOWNLOAD_TIMEOUT = 600   # saniye
+PLAYLIST_PAGE_TIMEOUT = 60  # Oynatma listesinde iki parti arası maksimum bekleme
+PLAYLIST_BATCH = 25         # Oynatma listesi girdileri kaçarlı gönderilsin
+
+
+# ──────────────────────────────────────────────────────────────
+#  İşçi süreci tarafı
+# ──────────────────────────────────────────────────────────────
+
+def _base_options() -> dict:
+    return {
+        "quiet": True,
+        "no_warnings": True,
+        "noplaylist": True,
+        "noprogress": True,
+    }
+
+
+def _job_metadata(yt_dlp, payload: dict, emit) -> dict:
+    """Videoyu çözümle, tüm bilgi dict'ini (JSON uyumlu) döndür."""
+    opts = _base_options()
+    opts["skip_download"] = True
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        info = ydl.extract_info(payload["url"], download=False)
+        return ydl.sanitize_info(info)
+
+
+def _job_download(yt_dlp, payload: dict, emit) -> dict:
+    """
+    Sesi indir. payload["info"] verilmişse (`--load-info-json` gibi) video
+    yeniden çözümlenmez; bilgi bayatsa (ör. imzalı linkin süresi dolmuşsa)
+    baştan çözümlemeye düşülür.
+    """
+    opts = _base_options()
+    opts["outtmpl"] = payload["outtmpl"]
+    if payload.get("mode") == "native":
+        # Orijinal ses akışı (opus/webm, m4a) — ffmpeg ile yeniden kodlama yok
+        opts["format"] = "bestaudio[acodec=opus]/bestaudio[ext=m4a]/bestaudio/best"
+    else:
+        opts["format"] = "bestaudio/best"  # Sadece ses
+        opts["postprocessors"] = [{
+            "key": "FFmpegExtractAudio",
+            "preferredcodec": "mp3",       # MP3 formatı (evrensel uyumluluk)
+            "preferredquality": "0",       # En iyi kalite
+        }]
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        info = None
+        if payload.get("info"):
+            try:
+                info = ydl.process_ie_result(payload["info"], download=True)
+            except Exception:
+                info = None
+        if info is None:
+            info = ydl.extract_info(payload["url"], download=True)
+    return {"title": info.get("title") or "", "duration": info.get("duration") or 0}
+
+
+def _job_playlist(yt_dlp, payload: dict, emit) -> dict:
+    """
+    Oynatma listesini düz (flat) olarak, sayfa sayfa çözümle ve girdileri
+    partiler halinde gönder. Girdilerin tam bilgisi burada çekilmez.
+    """
+    opts = _base_options()
+    opts.update({
+        "noplaylist": False,
+        "extract_flat": "in_playlist",
+        "lazy_playlist": True,
+    })
+    limit = payload.get("limit") or 0
+    count = 0
+    batch = []
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        info = ydl.extract_info(payload["url"], download=False, process=False)
+        for entry in info.get("entries") or []:
+            if not entry or not (entry.get("url") or entry.get("id")):
+                continue
+            batch.append({
+                "id": entry.get("id"),
+                "url": entry.get("url") or entry.get("id"),
+                "title": entry.get("title") or "",
+                "duration": entry.get("duration") or 0,
+            })
+            count += 1
+            if len(batch) >= PLAYLIST_BATCH:
+                emit(batch)
+                batch = []
+            if limit and count >= limit:
+                break
+        if batch:
+            emit(batch)
+    return {"title": info.get("title") or "", "count": count}
+
+
+_JOBS = {
+    "metadata": _job_metadata,
+    "download": _job_download,
+    "playlist": _job_playlist,
+}
+
+
+def _worker_main(conn):
+    """İşçi döngüsü: yt_dlp'yi bir kez yükle, işleri sırayla çalıştır."""
+    import yt_dlp
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+        if job is None:
+            break
+
+        kind, payload = job
+        emit = lambda data: conn.send(("item", data))
+        try:
+            conn.send(("ok", _JOBS[kind](yt_dlp, payload, emit)))
+        except Exception as e:
+            conn.send(("error", str(e)))
+
+
+# ──────────────────────────────────────────────────────────────
+#  Sunucu tarafı
+# ──────────────────────────────────────────────────────────────
+
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def is_alive(self) -> bool:
+        return self.process.is_alive()
+
+    def kill(self):
+        try:
+            self.process.kill()
+        except Exception:
+            pass
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+
+
+class YtdlpPool:
+    """
+    Sınırlı eşzamanlılıkla çalışan yt-dlp işçi havuzu.
+    Zaman aşımına uğrayan veya iptal edilen işin süreci öldürülür,
+    yerine gerektiğinde yenisi açılır.
+    """
+
+    def __init__(self, size: int = POOL_SIZE):
+        self.size = size
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle: List[_Worker] = []
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def start(self):
+        """İşçileri önceden başlat (ilk istekte import maliyeti olmasın)."""
+        for _ in range(self.size - len(self._idle)):
+            self._idle.append(await asyncio.to_thread(_Worker, self._ctx))
+
+    async def shutdown(self):
+        for worker in self._idle:
+            try:
+                worker.conn.send(None)
+            except Exception:
+                pass
+            worker.kill()
+        self._idle.clear()
+
+    async def run(self, kind: str, payload: dict, timeout: float):
+        """İşi boştaki bir işçide çalıştır ve sonucunu döndür."""
+        result = None
+        exchange = self._exchange(kind, payload, timeout)
+        try:
+            async for status, data in exchange:
+                if status == "ok":
+                    result = data
+        finally:
+            await exchange.aclose()
+        return result
+
+    async def stream(self, kind: str, payload: dict, timeout: float) -> AsyncIterator:
+        """
+        İşin ara çıktılarını (ör. oynatma listesi partileri) geldikçe döndür.
+        timeout iki çıktı arasındaki maksimum beklemedir. Tüketici erken
+        bırakırsa işçi süreci öldürülür.
+        """
+        exchange = self._exchange(kind, payload, timeout)
+        try:
+            async for status, data in exchange:
+                if status == "item":
+                    yield data
+        finally:
+            await exchange.aclose()
+
+    async def _exchange(self, kind: str, payload: dict, timeout: float):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.size)
+
+        async with self._semaphore:
+            worker = await self._acquire()
+            reusable = False
+            try:
+                worker.conn.send((kind, payload))
+                while True:
+                    status, data = await asyncio.wait_for(asyncio.to_thread(worker.conn.recv), timeout)
+                    if status == "item":
+                        yield status, data
+                        continue
+                    reusable = True
+                    if status == "error":
+                        raise RuntimeError(data)
+                    yield status, data
+                    return
+            except asyncio.TimeoutError:
+                raise RuntimeError(f"yt-dlp zaman aşımı ({int(timeout)} sn)")
+            except (EOFError, OSError):
+                raise RuntimeError("yt-dlp işçi süreci beklenmedik şekilde kapandı")
+            finally:
+                if reusable and worker.is_alive():
+                    self._idle.append(worker)
+                else:
+                    worker.kill()
+
+    async def _acquire(self) -> _Worker:
+        while self._idle:
+            candidate = self._idle.pop()
+            if candidate.is_alive():
+                return candidate
+            candidate.kill()
+        return await asyncio.to_thread(_Worker, self._ctx)
+
+
+ytdlp_pool = YtdlpPool()